@@ -0,0 +1,103 @@
+import asyncio
+import functools
+
+from urdf_parser_py import urdf
+
+# Asyncio loading of robot descriptions (Python 3.5+), see Loader.
+# A Source fetches the XML text of a description (I/O, overlapped between
+# loads), then the reflection parse runs in an executor so the event loop stays
+# responsive. Loading many descriptions then takes about as long as the
+# slowest fetch plus the parses, rather than the sum of all loads.
+
+# Loads in flight per Loader by default
+LIMIT = 16
+
+class Source(object):
+	""" Where descriptions come from: fetch(key) is a coroutine returning XML text or bytes """
+	async def fetch(self, key):
+		raise NotImplementedError()
+
+def read_file(path):
+	with open(path, 'rb') as f:
+		return f.read()
+
+class FileSource(Source):
+	""" Files, keyed by path, read in an executor (None for the loop's default one) """
+	def __init__(self, executor = None):
+		self.executor = executor
+
+	async def fetch(self, path):
+		loop = asyncio.get_event_loop()
+		return await loop.run_in_executor(self.executor, read_file, path)
+
+class ParameterSource(Source):
+	""" ROS parameter server, keyed by parameter name, see sources.ParameterSource; rospy runs in an executor """
+	def __init__(self, executor = None):
+		self.executor = executor
+
+	async def fetch(self, key = 'robot_description'):
+		import rospy
+		get_param = getattr(rospy, 'get_param_cached', rospy.get_param)
+		loop = asyncio.get_event_loop()
+		return await loop.run_in_executor(self.executor, get_param, key)
+
+class MemorySource(Source):
+	"""
+	Stand-in source for tests: descriptions from a dict, each fetch taking
+	delay seconds.
+	@ivar max_active: Most fetches seen in progress at once
+	"""
+	def __init__(self, descriptions, delay = 0):
+		self.descriptions = descriptions
+		self.delay = delay
+		self.active = 0
+		self.max_active = 0
+
+	async def fetch(self, key):
+		self.active += 1
+		self.max_active = max(self.max_active, self.active)
+		try:
+			await asyncio.sleep(self.delay)
+			return self.descriptions[key]
+		finally:
+			self.active -= 1
+
+class Loader(object):
+	"""
+	Loads descriptions from a source, with at most limit loads (fetch and
+	parse) in flight.
+	@param executor: concurrent.futures executor for parsing, None for the
+		loop's default one. Threads keep the loop responsive (each parse has
+		its own context, see ParseContext); a ProcessPoolExecutor also runs
+		parses in parallel.
+	@param options: Parse options, see xml_reflection.ParseContext
+	"""
+	def __init__(self, source = None, executor = None, limit = LIMIT, cls = urdf.Robot, **options):
+		self.source = source if source is not None else FileSource()
+		self.executor = executor
+		self.limit = limit
+		self.cls = cls
+		self.options = options
+		# (loop, semaphore), created in the running loop
+		self.semaphore = None
+
+	def get_semaphore(self):
+		loop = asyncio.get_event_loop()
+		if self.semaphore is None or self.semaphore[0] is not loop:
+			self.semaphore = (loop, asyncio.Semaphore(self.limit))
+		return self.semaphore[1]
+
+	async def load(self, key):
+		""" Fetch and parse one description """
+		async with self.get_semaphore():
+			xml_string = await self.source.fetch(key)
+			parse = functools.partial(self.cls.from_xml_string, xml_string, **self.options)
+			return await asyncio.get_event_loop().run_in_executor(self.executor, parse)
+
+	async def load_many(self, keys, return_exceptions = False):
+		""" Load all keys concurrently, returning the objects in the same order """
+		return await asyncio.gather(*[self.load(key) for key in keys], return_exceptions = return_exceptions)
+
+def load_files(paths, **kwargs):
+	""" Coroutine loading many files concurrently, see Loader """
+	return Loader(FileSource(), **kwargs).load_many(paths)
@@ -0,0 +1,164 @@
+import numpy
+
+from urdf_parser_py import urdf
+
+# Struct-of-arrays view of a urdf.Robot, see Robot.to_arrays().
+# Missing values (no <limit>, no origin, ...) are NaN, and unknown link
+# references are -1.
+
+def vector_or_nan(value, size = 3):
+	if value is None:
+		return [numpy.nan] * size
+	return value
+
+def pose_arrays(pose):
+	if pose is None:
+		return (vector_or_nan(None), vector_or_nan(None))
+	return (vector_or_nan(pose.xyz), vector_or_nan(pose.rpy))
+
+def number_or_nan(obj, var):
+	if obj is None:
+		return numpy.nan
+	value = getattr(obj, var)
+	return numpy.nan if value is None else value
+
+def to_vector(values):
+	""" List for a row of values, None if any is NaN """
+	if numpy.isnan(values).any():
+		return None
+	return values.tolist()
+
+def to_number(value):
+	return None if numpy.isnan(value) else float(value)
+
+def to_pose(pose, xyz, rpy):
+	""" Updated Pose (or None) from rows of an array """
+	(xyz, rpy) = (to_vector(xyz), to_vector(rpy))
+	if xyz is None and rpy is None:
+		return None
+	if pose is None:
+		pose = urdf.Pose()
+	else:
+		pose = pose.thaw()
+	pose.xyz = xyz
+	pose.rpy = rpy
+	return pose
+
+def update_object(obj, cls, values):
+	""" Set numeric vars of obj (created from cls if needed) from {var: value}; None if all missing """
+	values = dict((var, to_number(value)) for (var, value) in values.items())
+	if all(value is None for value in values.values()):
+		return None
+	if obj is None:
+		obj = cls()
+	else:
+		obj = obj.thaw()
+	for (var, value) in values.items():
+		setattr(obj, var, value)
+	return obj
+
+class RobotArrays(object):
+	"""
+	Named NumPy arrays for the joints (in robot.joints order) and links (in
+	robot.links order) of a robot:
+
+	joint_type (codes into urdf.Joint.TYPES), joint_parent, joint_child (link
+	indices), joint_axis, joint_origin_xyz, joint_origin_rpy, joint_lower,
+	joint_upper, joint_effort, joint_velocity, joint_mimic (joint index),
+	joint_mimic_multiplier, joint_mimic_offset;
+	link_parent (link index), link_parent_joint (joint index), link_mass,
+	link_inertia (3 x 3), link_inertial_xyz, link_inertial_rpy.
+
+	Edits to the arrays can be written back with apply().
+	"""
+	JOINT_TYPES = urdf.Joint.TYPES
+
+	def __init__(self, robot):
+		self.revision = robot.topology_revision
+		joints = robot.joints
+		links = robot.links
+		self.joint_names = [joint.name for joint in joints]
+		self.link_names = [link.name for link in links]
+		self.joint_index = dict((name, i) for (i, name) in enumerate(self.joint_names))
+		self.link_index = dict((name, i) for (i, name) in enumerate(self.link_names))
+		(joint_count, link_count) = (len(joints), len(links))
+
+		type_codes = dict((name, i) for (i, name) in enumerate(self.JOINT_TYPES))
+		self.joint_type = numpy.array([type_codes.get(joint.type, 0) for joint in joints], dtype = int)
+		self.joint_parent = numpy.array([self.link_index.get(joint.parent, -1) for joint in joints], dtype = int)
+		self.joint_child = numpy.array([self.link_index.get(joint.child, -1) for joint in joints], dtype = int)
+		self.joint_axis = numpy.array([vector_or_nan(joint.axis) for joint in joints], dtype = float).reshape(joint_count, 3)
+		origins = [pose_arrays(joint.origin) for joint in joints]
+		self.joint_origin_xyz = numpy.array([xyz for (xyz, rpy) in origins], dtype = float).reshape(joint_count, 3)
+		self.joint_origin_rpy = numpy.array([rpy for (xyz, rpy) in origins], dtype = float).reshape(joint_count, 3)
+		for var in ['lower', 'upper', 'effort', 'velocity']:
+			setattr(self, 'joint_' + var, numpy.array([number_or_nan(joint.limit, var) for joint in joints], dtype = float))
+		self.joint_mimic = numpy.array([-1 if joint.mimic is None else self.joint_index.get(joint.mimic.joint, -1)
+			for joint in joints], dtype = int)
+		self.joint_mimic_multiplier = numpy.array([number_or_nan(joint.mimic, 'multiplier') for joint in joints], dtype = float)
+		self.joint_mimic_offset = numpy.array([number_or_nan(joint.mimic, 'offset') for joint in joints], dtype = float)
+
+		self.link_parent = numpy.full(link_count, -1, dtype = int)
+		self.link_parent_joint = numpy.full(link_count, -1, dtype = int)
+		for (i, joint) in enumerate(joints):
+			child = self.joint_child[i]
+			if child >= 0:
+				self.link_parent[child] = self.joint_parent[i]
+				self.link_parent_joint[child] = i
+		inertials = [link.inertial for link in links]
+		self.link_mass = numpy.array([number_or_nan(inertial, 'mass') for inertial in inertials], dtype = float)
+		self.link_inertia = numpy.full((link_count, 3, 3), numpy.nan)
+		for (i, inertial) in enumerate(inertials):
+			if inertial is not None and inertial.inertia is not None:
+				self.link_inertia[i] = inertial.inertia.to_matrix()
+		origins = [pose_arrays(None if inertial is None else inertial.origin) for inertial in inertials]
+		self.link_inertial_xyz = numpy.array([xyz for (xyz, rpy) in origins], dtype = float).reshape(link_count, 3)
+		self.link_inertial_rpy = numpy.array([rpy for (xyz, rpy) in origins], dtype = float).reshape(link_count, 3)
+
+	def apply(self, robot):
+		"""
+		Write the array values back into robot's objects. Sub-objects are
+		created when values appear (i.e. a limit is set on a joint without one)
+		and set to None when all their values are NaN.
+		Names and joint / link counts are not changed.
+		"""
+		joints = robot.joints
+		links = robot.links
+		if [joint.name for joint in joints] != self.joint_names or [link.name for link in links] != self.link_names:
+			raise Exception("Robot joints or links do not match the arrays")
+		for (i, joint) in enumerate(joints):
+			joint.type = self.JOINT_TYPES[self.joint_type[i]]
+			if self.joint_parent[i] >= 0:
+				joint.parent = self.link_names[self.joint_parent[i]]
+			if self.joint_child[i] >= 0:
+				joint.child = self.link_names[self.joint_child[i]]
+			joint.axis = to_vector(self.joint_axis[i])
+			joint.origin = to_pose(joint.origin, self.joint_origin_xyz[i], self.joint_origin_rpy[i])
+			joint.limit = update_object(joint.limit, urdf.JointLimit, dict((var, getattr(self, 'joint_' + var)[i])
+				for var in ['lower', 'upper', 'effort', 'velocity']))
+			if joint.mimic is not None:
+				if self.joint_mimic[i] >= 0:
+					joint.mimic.joint = self.joint_names[self.joint_mimic[i]]
+				joint.mimic.multiplier = to_number(self.joint_mimic_multiplier[i])
+				joint.mimic.offset = to_number(self.joint_mimic_offset[i])
+		for (i, link) in enumerate(links):
+			inertia = self.link_inertia[i]
+			if link.inertial is None and numpy.isnan(self.link_mass[i]) and numpy.isnan(inertia).all():
+				continue
+			if link.inertial is None:
+				link.inertial = urdf.Inertial()
+			inertial = link.inertial
+			inertial.mass = to_number(self.link_mass[i])
+			inertial.inertia = update_object(inertial.inertia, urdf.Inertia, {
+				'ixx': inertia[0, 0], 'ixy': inertia[0, 1], 'ixz': inertia[0, 2],
+				'iyy': inertia[1, 1], 'iyz': inertia[1, 2], 'izz': inertia[2, 2]})
+			inertial.origin = to_pose(inertial.origin, self.link_inertial_xyz[i], self.link_inertial_rpy[i])
+		# Parent / child names may have changed
+		robot.parent_map = {}
+		robot.child_map = {}
+		for joint in joints:
+			robot.parent_map[joint.child] = (joint.name, joint.parent)
+			robot.child_map.setdefault(joint.parent, []).append((joint.name, joint.child))
+		robot.topology_revision += 1
+		# Still matches the objects
+		self.revision = robot.topology_revision
@@ -0,0 +1,108 @@
+import os
+import sys
+import time
+import traceback
+import multiprocessing
+
+import urdf_parser_py.xml_reflection as xmlr
+from urdf_parser_py import urdf
+from urdf_parser_py import cache
+
+# Batch parsing of many URDF files across a process pool, see parse_files().
+
+# Others, such as .xml, would also pick up package.xml and launch files
+EXTENSIONS = ('.urdf',)
+
+class ParseResult(object):
+	"""
+	Outcome of parsing one file in a worker.
+	@ivar summary: {'name', 'links', 'joints', 'root', 'parse_time'}, or None on failure
+	@ivar error: Formatted exception, or None
+	@ivar diagnostics: Messages reported through on_error while parsing
+	"""
+	def __init__(self, path):
+		self.path = path
+		self.summary = None
+		self.error = None
+		self.diagnostics = []
+		self.data = None
+	
+	@property
+	def ok(self):
+		return self.error is None
+	
+	@property
+	def robot(self):
+		""" Full parsed Robot, if requested with full = True """
+		if self.data is None:
+			return None
+		return cache.loads(self.data)
+
+def summarize(robot, parse_time):
+	try:
+		root = robot.get_root()
+	except AssertionError:
+		root = None
+	return {
+		'name': robot.name,
+		'links': len(robot.links),
+		'joints': len(robot.joints),
+		'root': root,
+		'parse_time': parse_time,
+		}
+
+def parse_file(path, full = False, cls = urdf.Robot):
+	""" Parse one file, capturing errors and on_error diagnostics in a ParseResult """
+	result = ParseResult(path)
+	context = xmlr.ParseContext(on_error = result.diagnostics.append)
+	try:
+		with open(path, 'rb') as f:
+			xml_string = f.read()
+		start = time.time()
+		robot = cls.from_xml_string(xml_string, context = context)
+		result.summary = summarize(robot, time.time() - start)
+		if full:
+			result.data = cache.dumps(robot)
+	except Exception:
+		result.error = ''.join(traceback.format_exception(*sys.exc_info()))
+	return result
+
+def parse_file_star(args):
+	return parse_file(*args)
+
+def find_files(directory, extensions = EXTENSIONS):
+	""" Sorted paths of description files under directory """
+	paths = []
+	for (dirpath, dirnames, filenames) in os.walk(directory):
+		for filename in filenames:
+			if filename.endswith(extensions):
+				paths.append(os.path.join(dirpath, filename))
+	paths.sort()
+	return paths
+
+def parse_files(paths, jobs = None, full = False, cls = urdf.Robot):
+	"""
+	Parse files across a process pool, yielding ParseResults in completion order.
+	@param jobs: Worker processes, defaults to the CPU count. 1 parses in this process.
+	@param full: Also send back the pickled Robot (see ParseResult.robot)
+		rather than only its summary.
+	"""
+	tasks = [(path, full, cls) for path in paths]
+	if jobs == 1:
+		for task in tasks:
+			yield parse_file_star(task)
+		return
+	pool = multiprocessing.Pool(jobs)
+	try:
+		for result in pool.imap_unordered(parse_file_star, tasks):
+			yield result
+		pool.close()
+	except:
+		pool.terminate()
+		raise
+	finally:
+		pool.join()
+
+def parse_directory(directory, jobs = None, full = False, cls = urdf.Robot, extensions = EXTENSIONS):
+	""" parse_files() over find_files(directory, extensions) """
+	return parse_files(find_files(directory, tuple(extensions)), jobs, full, cls)
@@ -0,0 +1,220 @@
+import io
+import os
+import errno
+import hashlib
+import struct
+import tempfile
+try:
+	import cPickle as pickle
+except ImportError:
+	import pickle
+
+from lxml import etree
+import urdf_parser_py
+import urdf_parser_py.xml_reflection as xmlr
+from urdf_parser_py import urdf
+
+# On-disk snapshot cache for parsed models, keyed by a hash of the XML input.
+# Snapshot layout: MAGIC, then a length-prefixed header naming the library
+# version, pickle protocol and reflection schema it was written with, then the
+# pickled object graph. Raw lxml nodes (i.e., <gazebo> blocks) are stored as XML text.
+
+MAGIC = b'URDFSNAP'
+FORMAT_VERSION = 3
+SUFFIX = '.snap'
+
+# os.rename() does not replace an existing file on Windows
+replace = getattr(os, 'replace', os.rename)
+
+def value_type_classes(value_type):
+	""" Reflected classes a value type can produce """
+	if isinstance(value_type, xmlr.ObjectType):
+		return [value_type.type]
+	elif isinstance(value_type, xmlr.FactoryType):
+		return list(value_type.typeMap.values())
+	elif isinstance(value_type, xmlr.DuckTypedFactory):
+		return list(value_type.type_order)
+	elif hasattr(value_type, 'factory'):
+		return value_type_classes(value_type.factory)
+	else:
+		return []
+
+def reflection_fingerprint(cls):
+	""" Hash of the reflection schema reachable from cls, to invalidate snapshots when it changes """
+	digest = hashlib.sha1()
+	visited = set()
+	pending = [cls]
+	while pending:
+		cur_cls = pending.pop()
+		if cur_cls in visited:
+			continue
+		visited.add(cur_cls)
+		digest.update('{}.{}\n'.format(cur_cls.__module__, cur_cls.__name__).encode('utf-8'))
+		reflection = cur_cls.XML_REFL
+		while reflection is not None:
+			for param in reflection.attributes + reflection.scalars + reflection.aggregates:
+				value_type = param.value_type
+				digest.update('{} {} {} {} {}\n'.format(type(param).__name__, param.xml_var,
+					param.var, type(value_type).__name__, param.required).encode('utf-8'))
+				for sub_cls in value_type_classes(value_type):
+					if isinstance(sub_cls, type) and issubclass(sub_cls, xmlr.Object):
+						pending.append(sub_cls)
+			reflection = reflection.parent
+	return digest.hexdigest()
+
+def to_bytes(xml_string):
+	if isinstance(xml_string, bytes):
+		return xml_string
+	return xml_string.encode('utf-8')
+
+def make_persistent_id():
+	""" lxml nodes are pickled as text; repeated references keep their identity """
+	ids = {}
+	def persistent_id(obj):
+		if not isinstance(obj, etree._Element):
+			return None
+		if id(obj) in ids:
+			return (ids[id(obj)][0], None)
+		# Keep obj alive so its id is not reused
+		ids[id(obj)] = (len(ids), obj)
+		return (ids[id(obj)][0], etree.tostring(obj))
+	return persistent_id
+
+def make_persistent_load():
+	nodes = {}
+	def persistent_load(pid):
+		(index, text) = pid
+		if text is not None:
+			nodes[index] = etree.fromstring(text)
+		return nodes[index]
+	return persistent_load
+
+def dump(obj, f):
+	""" Pickle an object graph that may hold lxml nodes """
+	pickler = pickle.Pickler(f, pickle.HIGHEST_PROTOCOL)
+	pickler.persistent_id = make_persistent_id()
+	pickler.dump(obj)
+
+def load(f):
+	unpickler = pickle.Unpickler(f)
+	unpickler.persistent_load = make_persistent_load()
+	return unpickler.load()
+
+def dumps(obj):
+	f = io.BytesIO()
+	dump(obj, f)
+	return f.getvalue()
+
+def loads(data):
+	return load(io.BytesIO(data))
+
+class SnapshotCache(object):
+	"""
+	Opt-in cache of parsed models in a directory, safe to share between
+	processes: entries are written to a temporary file and renamed into place,
+	and unreadable or stale entries are treated as misses.
+	@param max_size: Bound on the total size of the cache directory, in bytes.
+		Least recently used entries are evicted past it.
+	"""
+	def __init__(self, directory, max_size = 256 * 1024 * 1024, cls = urdf.Robot):
+		self.directory = directory
+		self.max_size = max_size
+		self.cls = cls
+		self.header = 'format:{};version:{};pickle:{};class:{}.{};schema:{}'.format(FORMAT_VERSION,
+			urdf_parser_py.__version__, pickle.HIGHEST_PROTOCOL, cls.__module__, cls.__name__,
+			reflection_fingerprint(cls)).encode('utf-8')
+		try:
+			os.makedirs(directory)
+		except OSError as e:
+			if e.errno != errno.EEXIST:
+				raise
+	
+	def get_path(self, data):
+		key = hashlib.sha1(self.header + b'\n' + data).hexdigest()
+		return os.path.join(self.directory, key + SUFFIX)
+	
+	def load(self, xml_string):
+		""" Return the cached object for this input, or None on a miss """
+		path = self.get_path(to_bytes(xml_string))
+		try:
+			with open(path, 'rb') as f:
+				if f.read(len(MAGIC)) != MAGIC:
+					return None
+				(size,) = struct.unpack('>I', f.read(4))
+				if f.read(size) != self.header:
+					return None
+				obj = load(f)
+		except Exception:
+			# Missing, truncated, or not loadable here (i.e. a renamed class)
+			return None
+		try:
+			# Mark as recently used
+			os.utime(path, None)
+		except OSError:
+			pass
+		return obj
+	
+	def store(self, xml_string, obj):
+		path = self.get_path(to_bytes(xml_string))
+		(fd, tmp_path) = tempfile.mkstemp(dir = self.directory, prefix = '.tmp-')
+		try:
+			with os.fdopen(fd, 'wb') as f:
+				f.write(MAGIC)
+				f.write(struct.pack('>I', len(self.header)))
+				f.write(self.header)
+				dump(obj, f)
+			# Atomic; the last writer of an identical entry wins
+			replace(tmp_path, path)
+		except:
+			try:
+				os.remove(tmp_path)
+			except OSError:
+				pass
+			raise
+		self.evict()
+	
+	def entries(self):
+		""" List (mtime, size, path) for each entry """
+		out = []
+		for name in os.listdir(self.directory):
+			if not name.endswith(SUFFIX):
+				continue
+			path = os.path.join(self.directory, name)
+			try:
+				info = os.stat(path)
+			except OSError:
+				continue
+			out.append((info.st_mtime, info.st_size, path))
+		return out
+	
+	def evict(self):
+		entries = self.entries()
+		total = sum(size for (mtime, size, path) in entries)
+		entries.sort()
+		for (mtime, size, path) in entries:
+			if total <= self.max_size:
+				break
+			try:
+				os.remove(path)
+			except OSError:
+				pass
+			total -= size
+	
+	def clear(self):
+		for (mtime, size, path) in self.entries():
+			try:
+				os.remove(path)
+			except OSError:
+				pass
+	
+	def from_xml_string(self, xml_string):
+		obj = self.load(xml_string)
+		if obj is None:
+			obj = self.cls.from_xml_string(xml_string)
+			self.store(xml_string, obj)
+		return obj
+	
+	def from_xml_file(self, file_path):
+		with open(file_path, 'rb') as f:
+			xml_string = f.read()
+		return self.from_xml_string(xml_string)
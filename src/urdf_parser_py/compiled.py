@@ -0,0 +1,402 @@
+import io
+import mmap
+import struct
+import numpy
+
+from urdf_parser_py import urdf
+from urdf_parser_py.arrays import RobotArrays, to_number
+
+# Compiled model files: the topology, names and numeric values of a urdf.Robot
+# in a fixed binary layout, opened with mmap and read in place, see dump() and
+# load(). Nothing is deserialized when opening a model: arrays are views into
+# the mapping, so pages are only read when touched and are shared between
+# processes by the OS.
+#
+# Layout (little-endian): MAGIC, FORMAT_VERSION and the section count as
+# uint32, then one SECTION entry per array (name, dtype, offset, shape), then
+# the array data, each aligned to ALIGNMENT bytes.
+# Name tables are stored as UTF-8 text, end offsets, and an index sorting
+# them for binary search.
+# Geometry, materials, transmissions and <gazebo> blocks are not compiled.
+
+MAGIC = b'URDFMODL'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<8sII')
+# name, dtype, offset, ndim, shape
+SECTION = struct.Struct('<32s8sQQQQQ')
+ALIGNMENT = 8
+
+def to_native(data):
+	""" Native string for UTF-8 bytes """
+	if bytes is str:
+		return data
+	return data.decode('utf-8')
+
+def to_utf8(text):
+	if isinstance(text, bytes):
+		return text
+	return text.encode('utf-8')
+
+def name_sections(prefix, names):
+	""" Sections for a name table, see NameTable """
+	encoded = [to_utf8(name) for name in names]
+	ends = numpy.cumsum([len(name) for name in encoded], dtype = '<i8')
+	order = sorted(range(len(encoded)), key = encoded.__getitem__)
+	return [
+		(prefix + '_text', numpy.frombuffer(b''.join(encoded), dtype = 'u1')),
+		(prefix + '_ends', ends),
+		(prefix + '_order', numpy.array(order, dtype = '<i8')),
+		]
+
+def get_depths(parents):
+	depths = [-1] * len(parents)
+	for i in range(len(parents)):
+		# Walk up to a link of known depth, then fill in the path
+		path = []
+		link = i
+		while link >= 0 and depths[link] < 0 and len(path) <= len(parents):
+			path.append(link)
+			link = parents[link]
+		depth = depths[link] if link >= 0 else -1
+		for link in reversed(path):
+			depth += 1
+			depths[link] = depth
+	return depths
+
+def get_sections(robot):
+	""" [(name, array)] to write for robot """
+	arrays = RobotArrays(robot)
+	sections = [('robot_name', numpy.frombuffer(to_utf8(robot.name or ''), dtype = 'u1'))]
+	sections += name_sections('link_names', arrays.link_names)
+	sections += name_sections('joint_names', arrays.joint_names)
+	for name in ['joint_type', 'joint_parent', 'joint_child', 'joint_mimic', 'link_parent', 'link_parent_joint']:
+		sections.append((name, getattr(arrays, name).astype('<i8')))
+	for name in ['joint_axis', 'joint_origin_xyz', 'joint_origin_rpy', 'joint_lower', 'joint_upper',
+			'joint_effort', 'joint_velocity', 'joint_mimic_multiplier', 'joint_mimic_offset',
+			'link_mass', 'link_inertia', 'link_inertial_xyz', 'link_inertial_rpy']:
+		sections.append((name, getattr(arrays, name).astype('<f8')))
+	sections.append(('link_depth', numpy.array(get_depths(arrays.link_parent.tolist()), dtype = '<i8')))
+	return sections
+
+def align(offset):
+	return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+def dump(robot, f):
+	""" Write the compiled model of robot to a path or binary file object """
+	if not hasattr(f, 'write'):
+		with open(f, 'wb') as output:
+			return dump(robot, output)
+	sections = get_sections(robot)
+	offset = align(HEADER.size + SECTION.size * len(sections))
+	table = []
+	for (name, array) in sections:
+		shape = list(array.shape) + [0] * (3 - array.ndim)
+		table.append(SECTION.pack(to_utf8(name), to_utf8(array.dtype.str), offset, array.ndim, *shape))
+		offset = align(offset + array.nbytes)
+	data = io.BytesIO()
+	data.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(sections)))
+	for entry in table:
+		data.write(entry)
+	for (name, array) in sections:
+		data.write(b'\0' * (align(data.tell()) - data.tell()))
+		data.write(array.tobytes())
+	f.write(data.getvalue())
+
+def dumps(robot):
+	f = io.BytesIO()
+	dump(robot, f)
+	return f.getvalue()
+
+def read_sections(data):
+	""" {name: read-only array} viewing a buffer in the compiled layout """
+	if len(data) < HEADER.size:
+		raise Exception("Not a compiled model")
+	(magic, version, count) = HEADER.unpack_from(data, 0)
+	if magic != MAGIC:
+		raise Exception("Not a compiled model")
+	if version != FORMAT_VERSION:
+		raise Exception("Unsupported compiled model version: {}".format(version))
+	sections = {}
+	for i in range(count):
+		(name, dtype, offset, ndim, rows, columns, depth) = SECTION.unpack_from(data, HEADER.size + SECTION.size * i)
+		shape = (rows, columns, depth)[:ndim]
+		array = numpy.frombuffer(data, dtype = to_native(dtype.rstrip(b'\0')),
+			count = int(numpy.prod(shape)), offset = offset).reshape(shape)
+		array.flags.writeable = False
+		sections[to_native(name.rstrip(b'\0'))] = array
+	return sections
+
+def load(path):
+	""" CompiledRobot for a file written by dump(), memory-mapped """
+	with open(path, 'rb') as f:
+		data = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+	return CompiledRobot(data)
+
+def loads(data):
+	""" CompiledRobot viewing a buffer (bytes, mmap, shared memory, ...) without copying """
+	return CompiledRobot(data)
+
+class NameTable(object):
+	""" Read-only sequence of names, with index() by binary search """
+	def __init__(self, sections, prefix):
+		self.text = sections[prefix + '_text']
+		self.ends = sections[prefix + '_ends']
+		self.order = sections[prefix + '_order']
+
+	def __len__(self):
+		return len(self.ends)
+
+	def get_bytes(self, i):
+		start = int(self.ends[i - 1]) if i > 0 else 0
+		return self.text[start:int(self.ends[i])].tobytes()
+
+	def __getitem__(self, i):
+		if i < 0:
+			i += len(self)
+		if not 0 <= i < len(self):
+			raise IndexError(i)
+		return to_native(self.get_bytes(i))
+
+	def __iter__(self):
+		for i in range(len(self)):
+			yield self[i]
+
+	def index(self, name):
+		""" Index of name, raising KeyError if missing """
+		key = to_utf8(name)
+		(low, high) = (0, len(self.order))
+		while low < high:
+			middle = (low + high) // 2
+			if self.get_bytes(int(self.order[middle])) < key:
+				low = middle + 1
+			else:
+				high = middle
+		if low < len(self.order):
+			i = int(self.order[low])
+			if self.get_bytes(i) == key:
+				return i
+		raise KeyError(name)
+
+class ViewMap(object):
+	""" Read-only name -> view mapping, like Robot.link_map """
+	def __init__(self, names, make_view):
+		self.names = names
+		self.make_view = make_view
+
+	def __getitem__(self, name):
+		return self.make_view(self.names.index(name))
+
+	def get(self, name, default = None):
+		try:
+			return self[name]
+		except KeyError:
+			return default
+
+	def __contains__(self, name):
+		return self.get(name) is not None
+
+	def __len__(self):
+		return len(self.names)
+
+	def __iter__(self):
+		return iter(self.names)
+
+	def keys(self):
+		return list(self.names)
+
+	def values(self):
+		return [self.make_view(i) for i in range(len(self.names))]
+
+	def items(self):
+		return [(name, self.make_view(i)) for (i, name) in enumerate(self.names)]
+
+class Record(object):
+	""" Values of a compiled sub-object (limit, mimic, ...) """
+	def __init__(self, **values):
+		self.__dict__.update(values)
+
+	def __repr__(self):
+		return 'Record({})'.format(', '.join('{}={!r}'.format(key, value) for (key, value) in sorted(self.__dict__.items())))
+
+def get_vector(row):
+	return None if numpy.isnan(row).any() else row
+
+def get_pose(xyz, rpy):
+	(xyz, rpy) = (get_vector(xyz), get_vector(rpy))
+	if xyz is None and rpy is None:
+		return None
+	return Record(xyz = xyz, rpy = rpy)
+
+def get_values(**values):
+	""" Record of numbers, None if all are missing """
+	values = dict((key, to_number(value)) for (key, value) in values.items())
+	if all(value is None for value in values.values()):
+		return None
+	return Record(**values)
+
+class CompiledJoint(object):
+	""" Read-only view of a joint in a CompiledRobot, with urdf.Joint's main attributes """
+	__slots__ = ('model', 'index')
+
+	def __init__(self, model, index):
+		self.model = model
+		self.index = index
+
+	def get(self, name):
+		return self.model.sections[name][self.index]
+
+	@property
+	def name(self):
+		return self.model.joint_names[self.index]
+
+	@property
+	def type(self):
+		return urdf.Joint.TYPES[self.get('joint_type')]
+
+	joint_type = type
+
+	@property
+	def parent(self):
+		return self.model.get_link_name(self.get('joint_parent'))
+
+	@property
+	def child(self):
+		return self.model.get_link_name(self.get('joint_child'))
+
+	@property
+	def axis(self):
+		return get_vector(self.get('joint_axis'))
+
+	@property
+	def origin(self):
+		return get_pose(self.get('joint_origin_xyz'), self.get('joint_origin_rpy'))
+
+	@property
+	def limit(self):
+		return get_values(lower = self.get('joint_lower'), upper = self.get('joint_upper'),
+			effort = self.get('joint_effort'), velocity = self.get('joint_velocity'))
+
+	@property
+	def mimic(self):
+		mimic = self.get('joint_mimic')
+		if mimic < 0:
+			return None
+		return Record(joint = self.model.joint_names[mimic], multiplier = to_number(self.get('joint_mimic_multiplier')),
+			offset = to_number(self.get('joint_mimic_offset')))
+
+class CompiledLink(object):
+	""" Read-only view of a link in a CompiledRobot; only its inertial is compiled """
+	__slots__ = ('model', 'index')
+
+	def __init__(self, model, index):
+		self.model = model
+		self.index = index
+
+	def get(self, name):
+		return self.model.sections[name][self.index]
+
+	@property
+	def name(self):
+		return self.model.link_names[self.index]
+
+	@property
+	def inertial(self):
+		mass = to_number(self.get('link_mass'))
+		inertia = self.get('link_inertia')
+		origin = get_pose(self.get('link_inertial_xyz'), self.get('link_inertial_rpy'))
+		if mass is None and numpy.isnan(inertia).all() and origin is None:
+			return None
+		if numpy.isnan(inertia).all():
+			inertia = None
+		return Record(mass = mass, inertia = inertia, origin = origin)
+
+class CompiledRobot(object):
+	"""
+	Read-only, urdf.Robot compatible view of a compiled model: name, link_map,
+	joint_map, links, joints, get_chain() and get_root(). Values are read from
+	the underlying buffer on access; vectors are read-only array views.
+	@ivar sections: {name: array}, i.e. the arrays of arrays.RobotArrays
+	"""
+	def __init__(self, data):
+		# Keeps the buffer (i.e. the mmap) alive
+		self.data = data
+		self.sections = read_sections(data)
+		self.name = to_native(self.sections['robot_name'].tobytes()) or None
+		self.link_names = NameTable(self.sections, 'link_names')
+		self.joint_names = NameTable(self.sections, 'joint_names')
+		self.link_map = ViewMap(self.link_names, self.get_link)
+		self.joint_map = ViewMap(self.joint_names, self.get_joint)
+
+	def get_link(self, index):
+		return CompiledLink(self, index)
+
+	def get_joint(self, index):
+		return CompiledJoint(self, index)
+
+	def get_link_name(self, index):
+		return None if index < 0 else self.link_names[index]
+
+	@property
+	def links(self):
+		return self.link_map.values()
+
+	@property
+	def joints(self):
+		return self.joint_map.values()
+
+	def get_root(self):
+		roots = numpy.flatnonzero(self.sections['link_parent'] < 0)
+		assert len(roots) <= 1, "Multiple roots detected, invalid URDF."
+		assert len(roots), "No roots detected, invalid URDF."
+		return self.link_names[roots[0]]
+
+	def walk_up(self, link, ancestor):
+		""" Link indices from link up to ancestor, which must be one of its ancestors """
+		parents = self.sections['link_parent']
+		links = [link]
+		while link != ancestor:
+			link = int(parents[link])
+			links.append(link)
+		return links
+
+	def get_lca(self, a, b):
+		""" Index of the lowest common ancestor of link indices a and b """
+		(start_a, start_b) = (a, b)
+		parents = self.sections['link_parent']
+		depths = self.sections['link_depth']
+		while depths[a] > depths[b]:
+			a = int(parents[a])
+		while depths[b] > depths[a]:
+			b = int(parents[b])
+		while a != b and a >= 0 and b >= 0:
+			(a, b) = (int(parents[a]), int(parents[b]))
+		# Links in separate trees reach -1 together
+		if a < 0 or b < 0 or a != b:
+			raise Exception("No path between links: {}, {}".format(self.link_names[start_a], self.link_names[start_b]))
+		return a
+
+	def get_chain(self, root, tip, joints=True, links=True, fixed=True):
+		""" Same as urdf.Robot.get_chain() """
+		(root_index, tip_index) = (self.link_names.index(root), self.link_names.index(tip))
+		lca = self.get_lca(root_index, tip_index)
+		up = self.walk_up(root_index, lca)
+		down = list(reversed(self.walk_up(tip_index, lca)))
+		parent_joints = self.sections['link_parent_joint']
+		fixed_type = urdf.Joint.TYPES.index('fixed')
+		joint_types = self.sections['joint_type']
+		chain = []
+		def add_joint(link):
+			joint = int(parent_joints[link])
+			if joints and (fixed or joint_types[joint] != fixed_type):
+				chain.append(self.joint_names[joint])
+		# Up from root to the common ancestor, then down to tip
+		for (i, link) in enumerate(up):
+			if links:
+				chain.append(self.link_names[link])
+			if i + 1 < len(up):
+				add_joint(link)
+		for link in down[1:]:
+			add_joint(link)
+			if links:
+				chain.append(self.link_names[link])
+		return chain
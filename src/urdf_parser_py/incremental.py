@@ -0,0 +1,197 @@
+import hashlib
+import weakref
+from lxml import etree
+
+import urdf_parser_py.xml_reflection as xmlr
+
+# Incremental re-parse of a urdf.Robot after edits to its source, see update().
+# Top-level elements are keyed by (tag, name, occurrence of that tag and name)
+# and compared by a hash of their text; only new or changed elements go through
+# the reflection again, and the robot is patched in place.
+# The element hashes of the last source each robot was updated to are kept, so
+# chained updates do not parse the previous source again.
+
+# Aggregates that make up the kinematic tree
+TOPOLOGY_TAGS = ('link', 'joint')
+
+# {robot: (source hash, [(key, hash)])}
+entry_cache = weakref.WeakKeyDictionary()
+
+class ChangeReport(object):
+	"""
+	Top-level elements that differ between two sources, as (tag, name) lists.
+	A changed element was re-parsed into a new object.
+	@ivar attributes_changed: Whether attributes of the root element changed
+	"""
+	def __init__(self):
+		self.added = []
+		self.removed = []
+		self.changed = []
+		self.attributes_changed = False
+
+	def __bool__(self):
+		return bool(self.added or self.removed or self.changed or self.attributes_changed)
+	__nonzero__ = __bool__
+
+	def get_names(self, tag):
+		""" Names of elements of this tag that were added, removed or changed """
+		return set(name for (cur_tag, name) in self.added + self.removed + self.changed if cur_tag == tag)
+
+	@property
+	def topology_changed(self):
+		""" Whether links or joints changed, i.e. Robot.topology_revision was incremented """
+		return any(tag in TOPOLOGY_TAGS for (tag, name) in self.added + self.removed + self.changed)
+
+	def __repr__(self):
+		return 'ChangeReport(added={}, removed={}, changed={}, attributes_changed={})'.format(self.added,
+			self.removed, self.changed, self.attributes_changed)
+
+def to_bytes(xml):
+	if isinstance(xml, etree._Element):
+		return etree.tostring(xml)
+	if isinstance(xml, bytes):
+		return xml
+	return xml.encode('utf-8')
+
+def to_root(xml):
+	if isinstance(xml, etree._Element):
+		return xml
+	return etree.fromstring(xml)
+
+def get_entries(root, element_map):
+	""" [(key, hash, node)] for the known top-level elements of root """
+	entries = []
+	counts = {}
+	for node in xmlr.xml_children(root):
+		if node.tag not in element_map:
+			continue
+		name = node.get('name')
+		count = counts.get((node.tag, name), 0)
+		counts[(node.tag, name)] = count + 1
+		digest = hashlib.sha1(etree.tostring(node, with_tail = False)).digest()
+		entries.append(((node.tag, name, count), digest, node))
+	return entries
+
+def get_old_entries(robot, old_xml, element_map):
+	""" ([(key, hash)], root attributes) for the previous source """
+	source_digest = hashlib.sha1(to_bytes(old_xml)).digest()
+	cached = entry_cache.get(robot)
+	if cached is not None and cached[0] == source_digest:
+		return cached[1:]
+	old_root = to_root(old_xml)
+	entries = [(key, digest) for (key, digest, node) in get_entries(old_root, element_map)]
+	return (entries, dict(old_root.attrib))
+
+def update(robot, old_xml, new_xml, **options):
+	"""
+	Bring robot, parsed from old_xml, up to date with new_xml: new and changed
+	top-level elements are parsed, the others keep their objects. Aggregate
+	lists and order, link_map, joint_map, parent_map and child_map are
+	patched in place, and topology_revision is incremented if links or
+	joints changed.
+	@param options: See xml_reflection.ParseContext, for the parsed elements
+	@return: ChangeReport
+	"""
+	reflection = robot.XML_REFL
+	element_map = reflection.element_map
+	report = ChangeReport()
+
+	(old_entries, old_attributes) = get_old_entries(robot, old_xml, element_map)
+	aggregates = [entry for entry in old_entries if element_map[entry[0][0]].is_aggregate]
+	if len(aggregates) != len(robot.aggregate_order) or any(robot.aggregate_type[obj] != key[0]
+			for ((key, digest), obj) in zip(aggregates, robot.aggregate_order)):
+		raise Exception("Robot does not match its previous source")
+	old_objects = dict((key, (digest, obj)) for ((key, digest), obj) in zip(aggregates, robot.aggregate_order))
+
+	new_root = to_root(new_xml)
+	new_entries = get_entries(new_root, element_map)
+	order = []
+	removed = []
+	added = []
+	with xmlr.core.parse_context(**options):
+		if old_attributes != dict(new_root.attrib):
+			report.attributes_changed = True
+			for attribute in reflection.attributes:
+				value = new_root.get(attribute.xml_var)
+				if value is not None:
+					attribute.set_from_string(robot, value)
+				elif attribute.required:
+					attribute.set_default(robot)
+				else:
+					# Drop the old value, even with skip_default
+					setattr(robot, attribute.var, attribute.default)
+		for (key, digest, node) in new_entries:
+			element = element_map[key[0]]
+			old = old_objects.pop(key, None)
+			if not element.is_aggregate:
+				if old is None or old[0] != digest:
+					element.set_from_xml(robot, node)
+				continue
+			if old is not None and old[0] == digest:
+				order.append((key[0], old[1]))
+				continue
+			obj = element.value_type.from_xml(node)
+			order.append((key[0], obj))
+			added.append((key[0], obj))
+			if old is None:
+				report.added.append(key[:2])
+			else:
+				removed.append((key[0], old[1]))
+				report.changed.append(key[:2])
+		# Same reports as a full parse
+		for name in new_root.attrib:
+			if name not in reflection.attribute_map:
+				xmlr.report_error('Unknown attribute: {}'.format(name))
+		for node in xmlr.xml_children(new_root):
+			if node.tag not in element_map:
+				xmlr.report_error('Unknown tag: {}'.format(node.tag))
+	for (key, digest) in aggregates:
+		if key in old_objects:
+			removed.append((key[0], old_objects[key][1]))
+			report.removed.append(key[:2])
+
+	# Aggregate lists and order, same as a full parse
+	robot.aggregate_order[:] = [obj for (tag, obj) in order]
+	robot.aggregate_type.clear()
+	lists = dict((element.xml_var, []) for element in reflection.aggregates)
+	for (tag, obj) in order:
+		robot.aggregate_type[obj] = tag
+		lists[tag].append(obj)
+	for (tag, values) in lists.items():
+		robot.get_aggregate_list(tag)[:] = values
+
+	patch_maps(robot, removed, added)
+	if report.topology_changed:
+		robot.topology_revision += 1
+	entry_cache[robot] = (hashlib.sha1(to_bytes(new_xml)).digest(),
+		[(key, digest) for (key, digest, node) in new_entries], dict(new_root.attrib))
+	return report
+
+def patch_map(values, keys, items):
+	""" Set values[key] for keys from (key, value) items, last one winning, and drop the keys without items """
+	found = {}
+	for (key, value) in items:
+		if key in keys:
+			found[key] = value
+	for key in keys:
+		if key in found:
+			values[key] = found[key]
+		else:
+			values.pop(key, None)
+
+def patch_maps(robot, removed, added):
+	""" Update the name and tree maps for removed and added (tag, object), as a full parse would set them """
+	changes = removed + added
+	link_names = set(obj.name for (tag, obj) in changes if tag == 'link')
+	joints = [obj for (tag, obj) in changes if tag == 'joint']
+	joint_names = set(joint.name for joint in joints)
+	children = set(joint.child for joint in joints)
+	parents = set(joint.parent for joint in joints)
+	patch_map(robot.link_map, link_names, ((link.name, link) for link in robot.links))
+	patch_map(robot.joint_map, joint_names, ((joint.name, joint) for joint in robot.joints))
+	patch_map(robot.parent_map, children, ((joint.child, (joint.name, joint.parent)) for joint in robot.joints))
+	child_lists = {}
+	for joint in robot.joints:
+		if joint.parent in parents:
+			child_lists.setdefault(joint.parent, []).append((joint.name, joint.child))
+	patch_map(robot.child_map, parents, child_lists.items())
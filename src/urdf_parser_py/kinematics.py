@@ -0,0 +1,383 @@
+import weakref
+import numpy
+
+# Kinematics on top of urdf.Robot, compiled to NumPy arrays.
+# Joint positions are given as a vector over the actuated joints (revolute,
+# continuous and prismatic joints that do not mimic another joint), in the
+# order of KinematicTree.dof_names.
+# Floating and planar joints are not supported, and are held at their origin.
+
+REVOLUTE_TYPES = ['revolute', 'continuous']
+PRISMATIC_TYPES = ['prismatic']
+MOVABLE_TYPES = REVOLUTE_TYPES + PRISMATIC_TYPES
+
+# {robot: (topology_revision, {key: compiled})}
+compiled_cache = weakref.WeakKeyDictionary()
+
+def rpy_to_matrix(rpy):
+	""" Rotation matrix for URDF fixed-axis roll, pitch, yaw """
+	(roll, pitch, yaw) = rpy
+	(cr, sr) = (numpy.cos(roll), numpy.sin(roll))
+	(cp, sp) = (numpy.cos(pitch), numpy.sin(pitch))
+	(cy, sy) = (numpy.cos(yaw), numpy.sin(yaw))
+	return numpy.array([
+		[cy * cp, cy * sp * sr - sy * cr, cy * sp * cr + sy * sr],
+		[sy * cp, sy * sp * sr + cy * cr, sy * sp * cr - cy * sr],
+		[-sp, cp * sr, cp * cr]])
+
+def pose_to_matrix(pose):
+	""" Homogeneous transform for a urdf.Pose, where None is the identity """
+	transform = numpy.eye(4)
+	if pose is not None:
+		if pose.rpy is not None:
+			transform[:3, :3] = rpy_to_matrix(pose.rpy)
+		if pose.xyz is not None:
+			transform[:3, 3] = pose.xyz
+	return transform
+
+def skew(vectors):
+	""" Cross product matrices for an (n, 3) array """
+	out = numpy.zeros(vectors.shape[:-1] + (3, 3))
+	(x, y, z) = (vectors[..., 0], vectors[..., 1], vectors[..., 2])
+	out[..., 0, 1] = -z
+	out[..., 0, 2] = y
+	out[..., 1, 0] = z
+	out[..., 1, 2] = -x
+	out[..., 2, 0] = -y
+	out[..., 2, 1] = x
+	return out
+
+def joint_axis(joint):
+	""" Unit axis of a joint, defaulting to x as in the URDF spec """
+	if joint.axis is None:
+		return numpy.array([1., 0., 0.])
+	axis = numpy.array(joint.axis, dtype = float)
+	norm = numpy.linalg.norm(axis)
+	if norm > 0:
+		axis /= norm
+	return axis
+
+class KinematicTree(object):
+	"""
+	Robot compiled for forward kinematics: joints in topological order with
+	their parent / child link indices, fixed origin transforms and axes.
+	Compile once and reuse across queries; per query, the cost is a few
+	vectorized operations per level of the tree.
+	"""
+	def __init__(self, robot):
+		root = robot.get_root()
+		self.link_names = [root]
+		self.joint_names = []
+		joint_parents = []
+		joint_children = []
+		depths = [0]
+		# Breadth-first, so parents always come before children
+		for (parent_index, link) in enumerate(self.link_names):
+			for (joint_name, child) in robot.child_map.get(link, []):
+				joint_parents.append(parent_index)
+				joint_children.append(len(self.link_names))
+				depths.append(depths[parent_index] + 1)
+				self.joint_names.append(joint_name)
+				self.link_names.append(child)
+		self.link_index = dict((name, i) for (i, name) in enumerate(self.link_names))
+		self.joint_index = dict((name, i) for (i, name) in enumerate(self.joint_names))
+		self.joint_parents = numpy.array(joint_parents, dtype = int)
+		self.joint_children = numpy.array(joint_children, dtype = int)
+
+		joints = [robot.joint_map[name] for name in self.joint_names]
+		count = len(joints)
+		self.joint_types = [joint.type for joint in joints]
+		self.origins = numpy.array([pose_to_matrix(joint.origin) for joint in joints]).reshape(count, 4, 4)
+		self.axes = numpy.array([joint_axis(joint) for joint in joints]).reshape(count, 3)
+		self.revolute = numpy.array([joint_type in REVOLUTE_TYPES for joint_type in self.joint_types], dtype = bool)
+		self.prismatic = numpy.array([joint_type in PRISMATIC_TYPES for joint_type in self.joint_types], dtype = bool)
+		self.axis_skew = skew(self.axes)
+		self.axis_skew_sq = numpy.matmul(self.axis_skew, self.axis_skew)
+
+		# Actuated joints
+		self.dof_names = [joint.name for joint in joints
+			if joint.type in MOVABLE_TYPES and joint.mimic is None]
+		self.dof_index = dict((name, i) for (i, name) in enumerate(self.dof_names))
+		self.dof = len(self.dof_names)
+
+		# Joint values are q_ext[source] * multiplier + offset, where q_ext is q
+		# with a trailing zero used by fixed joints
+		sources = numpy.empty(count, dtype = int)
+		multipliers = numpy.zeros(count)
+		offsets = numpy.zeros(count)
+		for (i, joint) in enumerate(joints):
+			(sources[i], multipliers[i], offsets[i]) = self.resolve_source(robot, joint, set())
+		self.sources = sources
+		self.multipliers = multipliers
+		self.offsets = offsets
+
+		# Joint connecting each link to its parent, -1 for the root
+		self.link_joints = numpy.full(len(self.link_names), -1, dtype = int)
+		self.link_joints[self.joint_children] = numpy.arange(count)
+		self.joint_depths = numpy.array(depths[1:], dtype = int)
+		self.selections = {}
+		self.full_selection = self.make_selection(range(len(self.link_names)), numpy.arange(count))
+
+	def resolve_source(self, robot, joint, visited):
+		""" (actuated index, multiplier, offset) for a joint, following mimic chains """
+		if joint.type not in MOVABLE_TYPES or joint.name in visited:
+			return (self.dof, 0., 0.)
+		if joint.mimic is None:
+			return (self.dof_index[joint.name], 1., 0.)
+		visited.add(joint.name)
+		mimic = joint.mimic
+		multiplier = 1. if mimic.multiplier is None else mimic.multiplier
+		offset = 0. if mimic.offset is None else mimic.offset
+		source = robot.joint_map.get(mimic.joint)
+		if source is None:
+			return (self.dof, 0., offset)
+		(index, source_multiplier, source_offset) = self.resolve_source(robot, source, visited)
+		return (index, multiplier * source_multiplier, multiplier * source_offset + offset)
+
+	def positions(self, values):
+		""" Joint position vector from a {joint name: position} dict; missing joints are zero """
+		q = numpy.zeros(self.dof)
+		for (name, value) in values.items():
+			q[self.dof_index[name]] = value
+		return q
+
+	def joint_values(self, q):
+		""" Values of all joints, mimic joints included, for positions of shape (..., dof) """
+		q = numpy.asarray(q, dtype = float)
+		if q.shape[-1] != self.dof:
+			raise Exception("Expected {} joint positions, got {}".format(self.dof, q.shape[-1]))
+		q_ext = numpy.concatenate([q, numpy.zeros(q.shape[:-1] + (1,))], axis = -1)
+		return q_ext[..., self.sources] * self.multipliers + self.offsets
+
+	def local_transforms(self, q, joints = None):
+		""" Parent-to-child transform of each joint (or of the given joint indices), shape (..., joints, 4, 4) """
+		values = self.joint_values(q)
+		if joints is None:
+			joints = slice(None)
+		values = values[..., joints]
+		motion = numpy.zeros(values.shape + (4, 4))
+		angles = numpy.where(self.revolute[joints], values, 0.)[..., numpy.newaxis, numpy.newaxis]
+		# Rodrigues' formula
+		motion[..., :3, :3] = numpy.eye(3) + numpy.sin(angles) * self.axis_skew[joints] \
+			+ (1 - numpy.cos(angles)) * self.axis_skew_sq[joints]
+		motion[..., :3, 3] = numpy.where(self.prismatic[joints], values, 0.)[..., numpy.newaxis] * self.axes[joints]
+		motion[..., 3, 3] = 1.
+		return numpy.matmul(self.origins[joints], motion)
+
+	def make_selection(self, links, joints):
+		"""
+		Program for the transforms of some links: the joint indices needed, and
+		those joints grouped by depth as (positions in joints, parent links, child links)
+		so that each level is one batched product.
+		"""
+		levels = []
+		depths = self.joint_depths[joints]
+		for depth in sorted(set(depths.tolist())):
+			positions = numpy.nonzero(depths == depth)[0]
+			levels.append((positions, self.joint_parents[joints[positions]], self.joint_children[joints[positions]]))
+		return (numpy.array(links, dtype = int), joints, levels)
+
+	def get_selection(self, links):
+		""" Cached selection for a list of link names, or all links for None """
+		if links is None:
+			return self.full_selection
+		key = tuple(links)
+		selection = self.selections.get(key)
+		if selection is None:
+			indices = [self.link_index[link] for link in links]
+			# Joints on the path to the root of any selected link
+			needed = set()
+			for index in indices:
+				joint = self.link_joints[index]
+				while joint >= 0 and joint not in needed:
+					needed.add(joint)
+					joint = self.link_joints[self.joint_parents[joint]]
+			selection = self.make_selection(indices, numpy.array(sorted(needed), dtype = int))
+			self.selections[key] = selection
+		return selection
+
+	def compute(self, q, selection):
+		""" Root-frame transforms of all links needed by selection, shape (..., links, 4, 4) """
+		(indices, joints, levels) = selection
+		local = self.local_transforms(q, joints)
+		out = numpy.empty(local.shape[:-3] + (len(self.link_names), 4, 4))
+		out[..., 0, :, :] = numpy.eye(4)
+		for (positions, parents, children) in levels:
+			out[..., children, :, :] = numpy.matmul(out[..., parents, :, :], local[..., positions, :, :])
+		return out
+
+	def link_transforms(self, q):
+		""" Transforms of all links in the root frame, shape (links, 4, 4), indexed by link_index """
+		return self.compute(q, self.full_selection)
+
+	def link_transform(self, q, link):
+		""" Transform of one link in the root frame """
+		selection = self.get_selection([link])
+		return self.compute(q, selection)[..., selection[0][0], :, :]
+
+	def batch_link_transforms(self, q, links = None, chunk_size = None, out = None):
+		"""
+		Link transforms for many configurations at once.
+		@param q: Joint positions, shape (N, dof)
+		@param links: Names of the links to return, in order. Only the joints
+			leading to them are computed. Default is all links, in link_names order.
+		@param chunk_size: Configurations per pass, to cap temporary memory
+			at roughly chunk_size * links * 128 bytes
+		@param out: Optional preallocated (N, len(links), 4, 4) array
+		@return Transforms of shape (N, len(links), 4, 4)
+		"""
+		q = numpy.asarray(q, dtype = float)
+		if q.ndim != 2:
+			raise Exception("Expected positions of shape (N, {}), got {}".format(self.dof, q.shape))
+		selection = self.get_selection(links)
+		indices = selection[0]
+		count = q.shape[0]
+		shape = (count, len(indices), 4, 4)
+		if out is None:
+			out = numpy.empty(shape)
+		elif out.shape != shape:
+			raise Exception("Invalid output shape {}, expected {}".format(out.shape, shape))
+		if chunk_size is None or chunk_size <= 0:
+			chunk_size = max(count, 1)
+		for start in range(0, count, chunk_size):
+			stop = min(start + chunk_size, count)
+			out[start:stop] = self.compute(q[start:stop], selection)[:, indices]
+		return out
+
+
+class KinematicChain(object):
+	"""
+	Serial chain between two links compiled for forward kinematics and the
+	geometric Jacobian. Positions are over the movable joints of
+	robot.get_chain(root, tip, links=False, fixed=False), in order; mimic
+	relations are not applied within a chain.
+	If tip does not descend from root, the joints from root up to their
+	common ancestor are traversed child to parent, i.e. inverted.
+	Runs of fixed joints are folded into a single transform.
+	"""
+	def __init__(self, robot, root, tip):
+		self.root = root
+		self.tip = tip
+		self.joint_names = []
+		self.revolute = []
+		axes = []
+		# Joints traversed child to parent
+		topology = robot.get_topology()
+		if topology.is_ancestor(root, tip):
+			upward = set()
+		else:
+			lca = topology.get_lca(root, tip)
+			upward = set(robot.get_chain(lca, root, joints = True, links = False, fixed = True))
+		# Fixed transform before each movable joint, and after the last
+		fixed = []
+		current = numpy.eye(4)
+		for name in robot.get_chain(root, tip, joints = True, links = False, fixed = True):
+			joint = robot.joint_map[name]
+			origin = pose_to_matrix(joint.origin)
+			axis = joint_axis(joint)
+			if name in upward:
+				# inv(origin * motion(q, axis)) = motion(q, -axis) * inv(origin)
+				(before, after) = (numpy.eye(4), numpy.linalg.inv(origin))
+				axis = -axis
+			else:
+				(before, after) = (origin, numpy.eye(4))
+			current = current.dot(before)
+			if joint.type in MOVABLE_TYPES:
+				fixed.append(current)
+				axes.append(axis)
+				self.joint_names.append(name)
+				self.revolute.append(joint.type in REVOLUTE_TYPES)
+				current = after
+			else:
+				current = current.dot(after)
+		fixed.append(current)
+		self.dof = len(self.joint_names)
+		self.fixed = numpy.array(fixed)
+		self.axes = numpy.array(axes).reshape(self.dof, 3)
+		self.axis_skew = skew(self.axes)
+		self.axis_skew_sq = numpy.matmul(self.axis_skew, self.axis_skew)
+
+	def compute(self, q, with_jacobian = True):
+		""" (tip transforms (..., 4, 4), Jacobians (..., 6, dof) or None) in the root frame """
+		q = numpy.asarray(q, dtype = float)
+		if q.shape[-1] != self.dof:
+			raise Exception("Expected {} joint positions, got {}".format(self.dof, q.shape[-1]))
+		batch = q.shape[:-1]
+		transform = numpy.empty(batch + (4, 4))
+		transform[...] = numpy.eye(4)
+		origins = numpy.empty(batch + (self.dof, 3))
+		axes = numpy.empty(batch + (self.dof, 3))
+		for k in range(self.dof):
+			transform = numpy.matmul(transform, self.fixed[k])
+			origins[..., k, :] = transform[..., :3, 3]
+			axes[..., k, :] = numpy.matmul(transform[..., :3, :3], self.axes[k])
+			value = q[..., k, numpy.newaxis, numpy.newaxis]
+			motion = numpy.zeros(batch + (4, 4))
+			motion[..., 3, 3] = 1.
+			if self.revolute[k]:
+				motion[..., :3, :3] = numpy.eye(3) + numpy.sin(value) * self.axis_skew[k] \
+					+ (1 - numpy.cos(value)) * self.axis_skew_sq[k]
+			else:
+				motion[..., :3, :3] = numpy.eye(3)
+				motion[..., :3, 3] = value[..., 0] * self.axes[k]
+			transform = numpy.matmul(transform, motion)
+		transform = numpy.matmul(transform, self.fixed[self.dof])
+		if not with_jacobian:
+			return (transform, None)
+		jacobian = numpy.zeros(batch + (6, self.dof))
+		revolute = numpy.array(self.revolute, dtype = bool)
+		tip = transform[..., numpy.newaxis, :3, 3]
+		linear = numpy.where(revolute[:, numpy.newaxis], numpy.cross(axes, tip - origins), axes)
+		jacobian[..., :3, :] = numpy.swapaxes(linear, -1, -2)
+		jacobian[..., 3:, :] = numpy.swapaxes(axes * revolute[:, numpy.newaxis], -1, -2)
+		return (transform, jacobian)
+
+	def transform(self, q):
+		""" Tip transform in the root frame """
+		return self.compute(q, with_jacobian = False)[0]
+
+	def jacobian(self, q):
+		""" 6 x dof geometric Jacobian (linear rows first) of the tip origin, in the root frame """
+		return self.compute(q)[1]
+
+	def batch_jacobian(self, q, chunk_size = None, out = None):
+		"""
+		Jacobians for many configurations.
+		@param q: Joint positions, shape (N, dof)
+		@param out: Optional preallocated (N, 6, dof) array
+		"""
+		q = numpy.asarray(q, dtype = float)
+		if q.ndim != 2:
+			raise Exception("Expected positions of shape (N, {}), got {}".format(self.dof, q.shape))
+		count = q.shape[0]
+		shape = (count, 6, self.dof)
+		if out is None:
+			out = numpy.empty(shape)
+		elif out.shape != shape:
+			raise Exception("Invalid output shape {}, expected {}".format(out.shape, shape))
+		if chunk_size is None or chunk_size <= 0:
+			chunk_size = max(count, 1)
+		for start in range(0, count, chunk_size):
+			stop = min(start + chunk_size, count)
+			out[start:stop] = self.compute(q[start:stop])[1]
+		return out
+
+def get_compiled(robot, key, factory):
+	""" Compiled form of robot for key, rebuilt when links or joints were added since """
+	entry = compiled_cache.get(robot)
+	if entry is None or entry[0] != robot.topology_revision:
+		entry = (robot.topology_revision, {})
+		compiled_cache[robot] = entry
+	value = entry[1].get(key)
+	if value is None:
+		value = factory()
+		entry[1][key] = value
+	return value
+
+def get_kinematic_tree(robot):
+	""" Cached KinematicTree for robot """
+	return get_compiled(robot, 'tree', lambda: KinematicTree(robot))
+
+def get_kinematic_chain(robot, root, tip):
+	""" Cached KinematicChain for robot between root and tip """
+	return get_compiled(robot, ('chain', root, tip), lambda: KinematicChain(robot, root, tip))
@@ -0,0 +1,162 @@
+import os
+import hashlib
+import threading
+
+from urdf_parser_py import urdf
+
+# Description sources (ROS parameter server, files, dicts) and a memoizing
+# loader on top of them, see CachedLoader. aio has coroutine counterparts of
+# the sources.
+
+class Source(object):
+	""" Where descriptions come from: fetch(key) returns XML text or bytes """
+	def fetch(self, key):
+		raise NotImplementedError()
+
+	def get_version(self, key):
+		"""
+		Cheap token that changes whenever the description may have changed
+		(i.e. a file's modification time), or None if unknown, to skip
+		fetches while it is the same
+		"""
+		return None
+
+class ParameterSource(Source):
+	"""
+	ROS parameter server, keyed by parameter name. Uses rospy.get_param_cached
+	where available, which only asks the master again after an update.
+	"""
+	def __init__(self):
+		import rospy
+		self.get_param = getattr(rospy, 'get_param_cached', rospy.get_param)
+
+	def fetch(self, key):
+		return self.get_param(key)
+
+class FileSource(Source):
+	""" Files, keyed by path """
+	def fetch(self, path):
+		with open(path, 'rb') as f:
+			return f.read()
+
+	def get_version(self, path):
+		info = os.stat(path)
+		return (getattr(info, 'st_mtime_ns', info.st_mtime), info.st_size)
+
+class MemorySource(Source):
+	""" Descriptions from a dict, i.e. a stand-in for tests """
+	def __init__(self, descriptions = None):
+		self.descriptions = {} if descriptions is None else descriptions
+
+	def fetch(self, key):
+		return self.descriptions[key]
+
+def get_digest(xml_string):
+	if not isinstance(xml_string, bytes):
+		xml_string = xml_string.encode('utf-8')
+	return hashlib.sha1(xml_string).digest()
+
+class CacheEntry(object):
+	def __init__(self, version, digest, obj):
+		self.version = version
+		self.digest = digest
+		self.obj = obj
+
+class CachedLoader(object):
+	"""
+	Loads descriptions from a source, keeping for each key the hash of the
+	last fetched text and the object parsed from it. While the text is
+	unchanged, load() returns that same object without parsing again, so
+	callers should not modify it.
+	@param options: Parse options, see xml_reflection.ParseContext
+	"""
+	def __init__(self, source, cls = urdf.Robot, **options):
+		self.source = source
+		self.cls = cls
+		self.options = options
+		self.entries = {}
+		self.lock = threading.Lock()
+
+	def poll(self, key):
+		""" (object, whether it was parsed again) for the current description """
+		version = self.source.get_version(key)
+		with self.lock:
+			entry = self.entries.get(key)
+		if entry is not None and version is not None and entry.version == version:
+			return (entry.obj, False)
+		xml_string = self.source.fetch(key)
+		digest = get_digest(xml_string)
+		if entry is not None and entry.digest == digest:
+			entry.version = version
+			return (entry.obj, False)
+		obj = self.cls.from_xml_string(xml_string, **self.options)
+		with self.lock:
+			self.entries[key] = CacheEntry(version, digest, obj)
+		return (obj, True)
+
+	def load(self, key):
+		return self.poll(key)[0]
+
+	def invalidate(self, key = None):
+		""" Forget one key, or all """
+		with self.lock:
+			if key is None:
+				self.entries.clear()
+			else:
+				self.entries.pop(key, None)
+
+	def watch(self, key, callback, interval = 1.0):
+		"""
+		Poll key every interval seconds in a background thread, calling
+		callback(obj) from that thread each time the description changed
+		(and once for the first load)
+		@return: Started Watcher
+		"""
+		watcher = Watcher(self, key, callback, interval)
+		watcher.start()
+		return watcher
+
+class Watcher(threading.Thread):
+	"""
+	Thread polling a CachedLoader, see CachedLoader.watch()
+	@ivar error: Last exception raised while polling, or None
+	"""
+	def __init__(self, loader, key, callback, interval):
+		threading.Thread.__init__(self)
+		self.daemon = True
+		self.loader = loader
+		self.key = key
+		self.callback = callback
+		self.interval = interval
+		self.error = None
+		self.stopped = threading.Event()
+
+	def run(self):
+		while not self.stopped.is_set():
+			try:
+				(obj, changed) = self.loader.poll(self.key)
+				self.error = None
+			except Exception as e:
+				# i.e. a description being rewritten; try again next time
+				self.error = e
+				changed = False
+			if changed:
+				self.callback(obj)
+			self.stopped.wait(self.interval)
+
+	def stop(self):
+		self.stopped.set()
+		if threading.current_thread() is not self:
+			self.join()
+
+# {class: CachedLoader} for Robot.from_parameter_server(cached = True)
+parameter_loaders = {}
+parameter_lock = threading.Lock()
+
+def get_parameter_loader(cls = urdf.Robot):
+	""" Shared CachedLoader over the parameter server for cls """
+	with parameter_lock:
+		loader = parameter_loaders.get(cls)
+		if loader is None:
+			loader = parameter_loaders[cls] = CachedLoader(ParameterSource(), cls)
+	return loader
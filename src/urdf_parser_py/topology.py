@@ -0,0 +1,134 @@
+# Link tree index for urdf.Robot, answering ancestry queries without walking
+# parent_map. Built once per topology revision, see Robot.get_topology().
+
+class TopologyIndex(object):
+	"""
+	Integer IDs for links, with parent / depth arrays, an Euler tour (entry and
+	exit times, so ancestor and subtree tests are O(1)) and binary lifting
+	tables (so lowest common ancestors are O(log n)).
+	"""
+	def __init__(self, robot):
+		self.revision = robot.topology_revision
+		self.link_names = list(robot.link_map.keys())
+		for (child, (joint, parent)) in robot.parent_map.items():
+			for link in [child, parent]:
+				if link not in robot.link_map and link not in self.link_names:
+					self.link_names.append(link)
+		self.link_ids = dict((name, i) for (i, name) in enumerate(self.link_names))
+		count = len(self.link_names)
+
+		self.parents = [-1] * count
+		self.parent_joints = [None] * count
+		children = [[] for i in range(count)]
+		for (child, (joint, parent)) in robot.parent_map.items():
+			child_id = self.link_ids[child]
+			parent_id = self.link_ids[parent]
+			self.parents[child_id] = parent_id
+			self.parent_joints[child_id] = joint
+			children[parent_id].append(child_id)
+		self.roots = [name for name in robot.link_map if self.parents[self.link_ids[name]] < 0]
+
+		# Euler tour: link i's subtree is preorder[entry[i]:exit[i]]
+		self.depths = [0] * count
+		self.entry = [-1] * count
+		self.exit = [-1] * count
+		self.preorder = []
+		for root in range(count):
+			if self.parents[root] >= 0:
+				continue
+			stack = [(root, False)]
+			while stack:
+				(link, done) = stack.pop()
+				if done:
+					self.exit[link] = len(self.preorder)
+					continue
+				self.entry[link] = len(self.preorder)
+				self.preorder.append(link)
+				stack.append((link, True))
+				for child in reversed(children[link]):
+					self.depths[child] = self.depths[link] + 1
+					stack.append((child, False))
+
+		# up[k][i] is the 2^k-th ancestor of i, or -1
+		self.up = [list(self.parents)]
+		span = 1
+		while span < count:
+			last = self.up[-1]
+			self.up.append([last[parent] if parent >= 0 else -1 for parent in last])
+			span *= 2
+
+	def get_id(self, link):
+		return self.link_ids[link]
+
+	def get_depth(self, link):
+		return self.depths[self.link_ids[link]]
+
+	def get_parent(self, link):
+		""" (joint, parent link) for link, or None at a root """
+		link_id = self.link_ids[link]
+		parent = self.parents[link_id]
+		if parent < 0:
+			return None
+		return (self.parent_joints[link_id], self.link_names[parent])
+
+	def is_ancestor(self, ancestor, link):
+		""" Whether ancestor is link or one of its ancestors, in O(1) """
+		a = self.link_ids[ancestor]
+		b = self.link_ids[link]
+		if self.entry[a] < 0 or self.entry[b] < 0:
+			# Unreachable from any root, i.e. on a cycle
+			return False
+		return self.entry[a] <= self.entry[b] and self.exit[b] <= self.exit[a]
+
+	def get_subtree(self, link):
+		""" Names of link and all its descendants, in depth-first order """
+		link_id = self.link_ids[link]
+		if self.entry[link_id] < 0:
+			return [link]
+		return [self.link_names[i] for i in self.preorder[self.entry[link_id]:self.exit[link_id]]]
+
+	def get_ancestor(self, link_id, steps):
+		""" Ancestor of a link ID `steps` levels up, in O(log n) """
+		k = 0
+		while steps and link_id >= 0:
+			if steps & 1:
+				link_id = self.up[k][link_id]
+			steps >>= 1
+			k += 1
+		return link_id
+
+	def get_lca(self, a, b):
+		""" Lowest common ancestor of two links, or None if they are in different trees """
+		a = self.link_ids[a]
+		b = self.link_ids[b]
+		if self.depths[a] < self.depths[b]:
+			(a, b) = (b, a)
+		a = self.get_ancestor(a, self.depths[a] - self.depths[b])
+		if a == b:
+			return self.link_names[a]
+		for k in reversed(range(len(self.up))):
+			if self.up[k][a] != self.up[k][b]:
+				a = self.up[k][a]
+				b = self.up[k][b]
+		parent = self.parents[a]
+		if parent < 0 or parent != self.parents[b]:
+			return None
+		return self.link_names[parent]
+
+	def get_path(self, a, b):
+		"""
+		Links from a up to the lowest common ancestor, and from there down to b,
+		as (up, down) where up starts with a and down ends with b. Both include
+		the common ancestor.
+		"""
+		lca = self.get_lca(a, b)
+		if lca is None:
+			raise Exception("No path between links: {}, {}".format(a, b))
+		return (self.walk_up(a, lca), list(reversed(self.walk_up(b, lca))))
+
+	def walk_up(self, link, ancestor):
+		links = [link]
+		while link != ancestor:
+			link = self.link_names[self.parents[self.link_ids[link]]]
+			links.append(link)
+		return links
@@ -13,6 +13,7 @@ xmlr.add_type('element_xyz', xmlr.SimpleElementType('xyz', 'vector3'))
 verbose = True
 
 class Pose(xmlr.Object):
+	XML_INTERN = True
 	def __init__(self, xyz=None, rpy=None):
 		self.xyz = xyz
 		self.rpy = rpy
@@ -41,6 +42,7 @@ name_attribute = xmlr.Attribute('name', str)
 origin_element = xmlr.Element('origin', Pose, False)
 
 class Color(xmlr.Object):
+	XML_INTERN = True
 	def __init__(self, *args):
 		# What about named colors?
 		count = len(args)
@@ -73,6 +75,7 @@ xmlr.reflect(JointDynamics, params = [
 
 
 class Box(xmlr.Object):
+	XML_INTERN = True
 	def __init__(self, size = None):
 		self.size = size
 
@@ -82,6 +85,7 @@ xmlr.reflect(Box, params = [
 
 
 class Cylinder(xmlr.Object):
+	XML_INTERN = True
 	def __init__(self, radius = 0.0, length = 0.0):
 		self.radius = radius
 		self.length = length
@@ -93,6 +97,7 @@ xmlr.reflect(Cylinder, params = [
 
 
 class Sphere(xmlr.Object):
+	XML_INTERN = True
 	def __init__(self, radius=0.0):
 		self.radius = radius
 
@@ -102,6 +107,7 @@ xmlr.reflect(Sphere, params = [
 
 
 class Mesh(xmlr.Object):
+	XML_INTERN = True
 	def __init__(self, filename = None, scale = None):
 		self.filename = filename
 		self.scale = scale
@@ -130,6 +136,11 @@ class GeometricType(xmlr.ValueType):
 		name = self.factory.get_name(obj)
 		child = node_add(node, name)
 		obj.write_xml(child)
+	
+	def write_stream(self, writer, tag, obj):
+		writer.start(tag)
+		writer.write_object(self.factory.get_name(obj), obj)
+		writer.end()
 
 xmlr.add_type('geometric', GeometricType())
 
@@ -145,6 +156,7 @@ xmlr.reflect(Collision, params = [
 
 
 class Texture(xmlr.Object):
+	XML_INTERN = True
 	def __init__(self, filename = None):
 		self.filename = filename
 
@@ -161,7 +173,7 @@ class Material(xmlr.Object):
 	
 	def check_valid(self):
 		if self.color is None and self.texture is None:
-			xmlr.on_error("Material has neither a color nor texture.")
+			xmlr.report_error("Material has neither a color nor texture.", xmlr.on_error)
 
 xmlr.reflect(Material, params = [
 	name_attribute,
@@ -170,6 +182,8 @@ xmlr.reflect(Material, params = [
 	])
 
 class LinkMaterial(Material):
+	XML_INTERN = True
+	
 	def check_valid(self):
 		pass
 
@@ -187,6 +201,7 @@ xmlr.reflect(Visual, params = [
 
 
 class Inertia(xmlr.Object):
+	XML_INTERN = True
 	KEYS = ['ixx', 'ixy', 'ixz', 'iyy', 'iyz', 'izz']
 	
 	def __init__(self, ixx=0.0, ixy=0.0, ixz=0.0, iyy=0.0, iyz=0.0, izz=0.0):
@@ -307,11 +322,11 @@ xmlr.reflect(Joint, params = [
 	xmlr.Element('axis', 'element_xyz', False),
 	xmlr.Element('parent', 'element_link'),
 	xmlr.Element('child', 'element_link'),
-	xmlr.Element('limit', JointLimit, False),
-	xmlr.Element('dynamics', JointDynamics, False),
-	xmlr.Element('safety_controller', SafetyController, False),
-	xmlr.Element('calibration', JointCalibration, False),
-	xmlr.Element('mimic', JointMimic, False),
+	xmlr.Element('limit', JointLimit, False, lazy = True),
+	xmlr.Element('dynamics', JointDynamics, False, lazy = True),
+	xmlr.Element('safety_controller', SafetyController, False, lazy = True),
+	xmlr.Element('calibration', JointCalibration, False, lazy = True),
+	xmlr.Element('mimic', JointMimic, False, lazy = True),
 	])
 
 
@@ -326,9 +341,9 @@ class Link(xmlr.Object):
 xmlr.reflect(Link, params = [
 	name_attribute,
 	origin_element,
-	xmlr.Element('inertial', Inertial, False),
-	xmlr.Element('visual', Visual, False),
-	xmlr.Element('collision', Collision, False)
+	xmlr.Element('inertial', Inertial, False, lazy = True),
+	xmlr.Element('visual', Visual, False, lazy = True),
+	xmlr.Element('collision', Collision, False, lazy = True)
 	])
 
 
@@ -361,9 +376,9 @@ xmlr.reflect(Actuator, tag = 'actuator', params = [
 
 class TransmissionJoint(xmlr.Object):
 	def __init__(self, name = None):
+		# hardwareInterfaces
 		self.aggregate_init()
 		self.name = name
-		self.hardwareInterfaces = []
 
 	def check_valid(self):
 		assert len(self.hardwareInterfaces) > 0, "no hardwareInterface defined"
@@ -377,10 +392,9 @@ xmlr.reflect(TransmissionJoint, tag = 'joint', params = [
 class Transmission(xmlr.Object):
 	""" New format: http://wiki.ros.org/urdf/XML/Transmission """
 	def __init__(self, name = None):
+		# joints, actuators
 		self.aggregate_init()
 		self.name = name
-		self.joints = []
-		self.actuators = []
 
 	def check_valid(self):
 		assert len(self.joints) > 0, "no joint defined"
@@ -396,15 +410,17 @@ xmlr.reflect(Transmission, tag = 'new_transmission', params = [
 xmlr.add_type('transmission', xmlr.DuckTypedFactory('transmission', [Transmission, PR2Transmission]))
 
 class Robot(xmlr.Object):
+	XML_COMPACT = False
+	# Incremented whenever links or joints are added, for dependent caches
+	topology_revision = 0
+	topology_index = None
+	robot_arrays = None
+	
 	def __init__(self, name = None):
+		# joints, links, materials, gazebos, transmissions
 		self.aggregate_init()
 		
 		self.name = name
-		self.joints = []
-		self.links = []
-		self.materials = []
-		self.gazebos = []
-		self.transmissions = []
 		
 		self.joint_map = {}
 		self.link_map = {}
@@ -426,6 +442,32 @@ class Robot(xmlr.Object):
 		elif typeName == 'link':
 			link = elem
 			self.link_map[link.name] = link
+		else:
+			return
+		self.topology_revision += 1
+
+	def remove_aggregate(self, elem):
+		typeName = self.aggregate_type[elem]
+		xmlr.Object.remove_aggregate(self, elem)
+		
+		if typeName == 'joint':
+			joint = elem
+			if self.joint_map.get(joint.name) is joint:
+				del self.joint_map[joint.name]
+			if self.parent_map.get(joint.child) == (joint.name, joint.parent):
+				del self.parent_map[joint.child]
+			children = self.child_map.get(joint.parent)
+			if children is not None and (joint.name, joint.child) in children:
+				children.remove((joint.name, joint.child))
+				if not children:
+					del self.child_map[joint.parent]
+		elif typeName == 'link':
+			link = elem
+			if self.link_map.get(link.name) is link:
+				del self.link_map[link.name]
+		else:
+			return
+		self.topology_revision += 1
 
 	def add_link(self, link):
 		self.add_aggregate('link', link)
@@ -433,7 +475,32 @@ class Robot(xmlr.Object):
 	def add_joint(self, joint):
 		self.add_aggregate('joint', joint)
 
+	def remove_link(self, link):
+		""" Remove a link (object or name), in O(1) """
+		if xmlr.isstring(link):
+			link = self.link_map[link]
+		self.remove_aggregate(link)
+
+	def remove_joint(self, joint):
+		""" Remove a joint (object or name), in O(1) plus the size of its parent's child_map entry """
+		if xmlr.isstring(joint):
+			joint = self.joint_map[joint]
+		self.remove_aggregate(joint)
+
 	def get_chain(self, root, tip, joints=True, links=True, fixed=True):
+		"""
+		Links and / or joints from root to tip. If tip does not descend from
+		root, the chain goes up from root to their common ancestor, then down.
+		"""
+		topology = self.get_topology()
+		if not topology.is_ancestor(root, tip):
+			lca = topology.get_path(root, tip)[0][-1]
+			chain = self.get_chain(lca, root, joints, links, fixed)
+			chain.reverse()
+			if links:
+				# Common ancestor is at the end of both halves
+				chain.pop()
+			return chain + self.get_chain(lca, tip, joints, links, fixed)
 		chain = []
 		if links:
 			chain.append(tip)
@@ -449,26 +516,65 @@ class Robot(xmlr.Object):
 		chain.reverse()
 		return chain
 
+	def get_topology(self):
+		""" TopologyIndex for the current links and joints, rebuilt lazily after changes """
+		topology = self.topology_index
+		if topology is None or topology.revision != self.topology_revision:
+			from urdf_parser_py.topology import TopologyIndex
+			topology = TopologyIndex(self)
+			self.topology_index = topology
+		return topology
+
+	def to_arrays(self, refresh = False):
+		"""
+		Cached arrays.RobotArrays for this robot (requires NumPy). The cache
+		follows topology_revision; use refresh after editing object values.
+		"""
+		arrays = self.robot_arrays
+		if refresh or arrays is None or arrays.revision != self.topology_revision:
+			from urdf_parser_py.arrays import RobotArrays
+			arrays = RobotArrays(self)
+			self.robot_arrays = arrays
+		return arrays
+
+	def update_from_xml_string(self, old_xml_string, xml_string, **options):
+		"""
+		Re-parse only the top-level elements that differ between the source this
+		robot was parsed from and a new one, see incremental.update()
+		@return: incremental.ChangeReport
+		"""
+		from urdf_parser_py import incremental
+		return incremental.update(self, old_xml_string, xml_string, **options)
+
 	def get_root(self):
-		root = None
-		for link in self.link_map:
-			if link not in self.parent_map:
-				assert root is None, "Multiple roots detected, invalid URDF."
-				root = link
-		assert root is not None, "No roots detected, invalid URDF."
-		return root
+		roots = self.get_topology().roots
+		assert len(roots) <= 1, "Multiple roots detected, invalid URDF."
+		assert roots, "No roots detected, invalid URDF."
+		return roots[0]
 
 	@classmethod
-	def from_parameter_server(cls, key = 'robot_description'):
+	def from_parameter_server(cls, key = 'robot_description', cached = False):
 		"""
 		Retrieve the robot model on the parameter server
 		and parse it to create a URDF robot structure.
 
 		Warning: this requires roscore to be running.
+		@param cached: Return the robot parsed by a previous cached call while
+			the description is unchanged (see sources.CachedLoader); it is
+			shared, so do not modify it
 		"""
+		if cached:
+			from urdf_parser_py import sources
+			return sources.get_parameter_loader(cls).load(key)
 		# Could move this into xml_reflection
 		import rospy
 		return cls.from_xml_string(rospy.get_param(key))
+
+	@classmethod
+	def from_parameter_server_async(cls, key = 'robot_description', **options):
+		""" Coroutine (Python 3) for from_parameter_server(), see aio.Loader """
+		from urdf_parser_py import aio
+		return aio.Loader(aio.ParameterSource(), cls = cls, **options).load(key)
 	
 xmlr.reflect(Robot, tag = 'robot', params = [
 	xmlr.Attribute('name', str, False), # Is 'name' a required attribute?
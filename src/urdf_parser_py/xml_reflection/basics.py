@@ -1,8 +1,12 @@
 import string
 import yaml
-import collections
 from lxml import etree
 
+try:
+    from collections.abc import Iterable
+except ImportError:
+    from collections import Iterable
+
 # Different implementations mix well it seems
 # @todo Do not use this?
 from xml.etree.ElementTree import ElementTree
@@ -62,17 +66,21 @@ def to_yaml(obj):
     elif hasattr(obj, 'tolist'):
         # For numpy objects
         out = to_yaml(obj.tolist())
-    elif isinstance(obj, collections.Iterable):
+    elif isinstance(obj, Iterable):
         out = [to_yaml(item) for item in obj]
     else:
         out = str(obj)
     return out
 
 class SelectiveReflection(object):
+	__slots__ = ()
+	
 	def get_refl_vars(self):
 		return list(vars(self).keys())
 
 class YamlReflection(SelectiveReflection):
+	__slots__ = ()
+	
 	def to_yaml(self):
 		raw = dict((var, getattr(self, var)) for var in self.get_refl_vars())
 		return to_yaml(raw)
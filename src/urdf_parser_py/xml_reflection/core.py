@@ -1,6 +1,17 @@
 from urdf_parser_py.xml_reflection.basics import *
 import sys
 import copy
+import threading
+import contextlib
+try:
+	from collections.abc import MutableSequence
+except ImportError:
+	from collections import MutableSequence
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
 
 # @todo Get rid of "import *"
 # @todo Make this work with decorators
@@ -14,6 +25,8 @@ import copy
 def reflect(cls, *args, **kwargs):
 	""" Simple wrapper to add XML reflection to an xml_reflection.Object class """
 	cls.XML_REFL = Reflection(*args, **kwargs)
+	# Bound once, see get_object_type()
+	cls.XML_TYPE = get_type(cls)
 
 # Rename 'write_xml' to 'write_xml' to have paired 'load/dump', and make 'pre_dump' and 'post_load'?
 # When dumping to yaml, include tag name?
@@ -23,36 +36,201 @@ def on_error(message):
 	""" What to do on an error. This can be changed to raise an exception. """
 	sys.stderr.write(message + '\n')
 
+def raise_error(message):
+	""" on_error policy for ParseContext, failing on the first error """
+	raise Exception(message)
+
 skip_default = True
 #defaultIfMatching = True # Not implemeneted yet
 
+# Parse through flattened, precompiled plans (see ParsePlan) instead of walking
+# the reflection chain for every node. Set to False to use the original path.
+use_parse_plans = True
+# Write XML text directly (see writer.py) instead of through an lxml tree
+use_fast_writer = True
+
+class ParseContext(object):
+	"""
+	Options for one parse, given as keyword arguments to Object.from_xml() and
+	friends, i.e. Robot.from_xml_string(text, compact = True).
+	@param compact: Build slot-based classes (see compact_class()) with tuple vectors
+	@param intern: Share one read-only instance between structurally identical
+		elements of classes with XML_INTERN set, and between identical vectors
+		(see intern_object()). True uses a table for this parse only; pass a
+		dict to share it across parses.
+	@param lazy: Keep the nodes of elements declared with lazy = True, and only
+		decode them on first access (see Object.__getattr__, Object.materialize())
+	@param numpy_vectors: Parse vectors (vector3, vector4, ...) into NumPy float
+		arrays; these are read-only when interned
+	@param pack_floats: Pack all float values into one array once parsed,
+		stored as obj.float_buffer except on compact roots (see
+		storage.FloatBuffer, pack_floats())
+	@param profile: {tag: [names]}, where only the listed attributes and child
+		elements of matching nodes are loaded, i.e.
+		{'joint': ['name', 'type', 'parent', 'child'], 'link': ['name']}.
+		Keys may also be paths of tags, such as 'transmission/joint'; the
+		longest match wins. Skipped names are still checked (required
+		names, unknown names), but projected objects are not passed to
+		check_valid().
+	@param on_error: Function called with each error message (unknown or
+		repeated names, ...) instead of the module's on_error, i.e.
+		raise_error
+	@param diagnostics: List that error messages are also appended to
+	@param skip_default: Overrides the module's skip_default
+
+	Contexts are per thread (see use_context()), so parses with their own
+	context can run in parallel threads.
+	"""
+	def __init__(self, compact = False, intern = False, lazy = False, profile = None, numpy_vectors = False, pack_floats = False,
+			on_error = None, diagnostics = None, skip_default = None):
+		self.compact = compact
+		if pack_floats and numpy is None:
+			raise Exception("NumPy is required for pack_floats")
+		self.pack_floats = pack_floats
+		self.lazy = lazy
+		if numpy_vectors and numpy is None:
+			raise Exception("NumPy is required for numpy_vectors")
+		self.numpy_vectors = numpy_vectors
+		if intern is True:
+			intern = {}
+		elif intern is False:
+			intern = None
+		self.interned = intern
+		self.profile = None
+		if profile is not None:
+			self.profile = dict((key, frozenset(names)) for (key, names) in profile.items())
+			self.profile_depth = max([key.count('/') + 1 for key in profile] or [0])
+			self.profile_key = frozenset(self.profile.items())
+		self.on_error = on_error
+		self.diagnostics = diagnostics
+		self.skip_default = skip_default
+	
+	def report(self, message, default = None):
+		""" Handle an error message, through default (or the module's on_error) if no on_error was given """
+		if self.diagnostics is not None:
+			self.diagnostics.append(message)
+		handler = self.on_error or default or on_error
+		handler(message)
+	
+	def get_profile(self, node):
+		""" Names to load for node, or None to load everything """
+		if self.profile is None:
+			return None
+		tags = [node.tag]
+		parent = node.getparent()
+		while parent is not None and len(tags) < self.profile_depth:
+			tags.insert(0, parent.tag)
+			parent = parent.getparent()
+		for i in range(len(tags)):
+			names = self.profile.get('/'.join(tags[i:]))
+			if names is not None:
+				return names
+		return None
+
+	def get_intern_key(self, node):
+		"""
+		Options that change what node parses into, for intern_object() keys:
+		the vector type, the profile and the ancestor tags its paths may match on
+		"""
+		if self.profile is None:
+			return (self.numpy_vectors, None)
+		tags = []
+		parent = node.getparent()
+		while parent is not None and len(tags) < self.profile_depth - 1:
+			tags.insert(0, parent.tag)
+			parent = parent.getparent()
+		return (self.numpy_vectors, self.profile_key, tuple(tags))
+
+# Context of parses without options
+default_context = ParseContext()
+
+class ThreadState(threading.local):
+	""" Parse context in use and type namespace, for each thread """
+	def __init__(self):
+		self.context = default_context
+		self.prefix = ''
+
+state = ThreadState()
+
+def get_context():
+	""" ParseContext of the parse in progress in this thread """
+	return state.context
+
+@contextlib.contextmanager
+def parse_context(context = None, **options):
+	"""
+	Use context, or a ParseContext with the given options; with neither,
+	keep the current one
+	"""
+	if context is None:
+		if not options:
+			yield state.context
+			return
+		context = ParseContext(**options)
+	elif options:
+		raise Exception("Cannot give both a context and options: {}".format(', '.join(sorted(options))))
+	with use_context(context):
+		yield context
+
+@contextlib.contextmanager
+def use_context(context):
+	""" Use context in this thread """
+	previous = state.context
+	state.context = context
+	try:
+		yield context
+	finally:
+		state.context = previous
+
+def report_error(message, default = None):
+	""" Report an error through the current context, see ParseContext.report() """
+	state.context.report(message, default)
+
+def get_skip_default():
+	""" skip_default of the current context, or the module's """
+	value = state.context.skip_default
+	return skip_default if value is None else value
+
 # Registering Types
 value_types = {}
-value_type_prefix = '' 
+# {(namespace prefix, type): value type}, resolved get_type() lookups. Entries
+# are only added, under types_lock, so lookups can run from any thread.
+resolved_types = {}
+types_lock = threading.RLock()
 
 def start_namespace(namespace):
 	"""
 	Basic mechanism to prevent conflicts for string types for URDF and SDF
 	@note Does not handle nesting!
 	"""
-	global value_type_prefix
-	value_type_prefix = namespace + '.'
+	state.prefix = namespace + '.'
 
 def end_namespace():
-	global value_type_prefix
-	value_type_prefix = ''
+	state.prefix = ''
 
 def add_type(key, value):
 	if isinstance(key, str):
-		key = value_type_prefix + key
-	assert key not in value_types
-	value_types[key] = value
+		key = state.prefix + key
+	with types_lock:
+		assert key not in value_types
+		value_types[key] = value
+		# A lookup may have resolved to the global type before
+		resolved_types.clear()
 
 def get_type(cur_type):
 	""" Can wrap value types if needed """
-	if value_type_prefix and isinstance(cur_type, str):
+	key = (state.prefix, cur_type)
+	value_type = resolved_types.get(key)
+	if value_type is None:
+		with types_lock:
+			value_type = resolve_type(cur_type)
+			resolved_types[key] = value_type
+	return value_type
+
+def resolve_type(cur_type):
+	if state.prefix and isinstance(cur_type, str):
 		# See if it exists in current 'namespace'
-		curKey = value_type_prefix + cur_type
+		curKey = state.prefix + cur_type
 		value_type = value_types.get(curKey)
 	else:
 		value_type = None
@@ -64,6 +242,14 @@ def get_type(cur_type):
 		add_type(cur_type, value_type)
 	return value_type
 
+def get_object_type(cls):
+	""" ObjectType for a reflected class, without a registry lookup once reflect()ed """
+	# Not inherited: subclasses have their own
+	value_type = cls.__dict__.get('XML_TYPE')
+	if value_type is None:
+		value_type = get_type(cls)
+	return value_type
+
 def make_type(cur_type):
 	if isinstance(cur_type, ValueType):
 		return cur_type
@@ -71,7 +257,7 @@ def make_type(cur_type):
 		if cur_type.startswith('vector'):
 			extra = cur_type[6:]
 			if extra:
-				count = float(extra)
+				count = int(extra)
 			else:
 				count = None
 			return VectorType(count)
@@ -104,6 +290,9 @@ class BasicType(ValueType):
 	def __init__(self, cur_type):
 		self.type = cur_type
 	def to_string(self, value):
+		if hasattr(value, 'tolist'):
+			# NumPy scalar, see storage.FloatBuffer
+			value = value.tolist()
 		return str(value)
 	def from_string(self, value):
 		return self.type(value)
@@ -126,13 +315,32 @@ class VectorType(ListType):
 	
 	def to_string(self, values):
 		self.check(values)
-		raw = list(map(str, values))
-		return ListType.to_string(self, raw)
+		if hasattr(values, 'tolist'):
+			# Python floats, for the same formatting as lists
+			values = values.tolist()
+		return ' '.join(map(str, values))
 		
 	def from_string(self, text):
-		raw = ListType.from_string(self, text)
-		self.check(raw)
+		raw = text.split()
+		if self.count is not None and len(raw) != self.count:
+			self.check(raw)
+		context = state.context
+		if context.numpy_vectors:
+			return self.to_array(raw, context.interned)
+		if context.interned is not None:
+			value = tuple(map(float, raw))
+			return context.interned.setdefault(value, value)
+		if context.compact:
+			return tuple(map(float, raw))
 		return list(map(float, raw))
+	
+	def to_array(self, raw, interned = None):
+		value = numpy.array(list(map(float, raw)))
+		if interned is not None:
+			# Shared, so read-only
+			value.flags.writeable = False
+			value = interned.setdefault(('array',) + tuple(value.tolist()), value)
+		return value
 
 class RawType(ValueType):
 	""" Simple, raw XML value. Need to bugfix putting this back into a document """
@@ -141,10 +349,11 @@ class RawType(ValueType):
 	
 	def write_xml(self, node, value):
 		# @todo rying to insert an element at root level seems to screw up pretty printing
+		# Copy, so the value can be written more than once
 		children = xml_children(value)
-		list(map(node.append, children))
+		list(map(node.append, map(copy.deepcopy, children)))
 		# Copy attributes
-		for (attrib_key, attrib_value) in value.attrib.iteritems():
+		for (attrib_key, attrib_value) in value.attrib.items():
 			node.set(attrib_key, attrib_value)
 
 class SimpleElementType(ValueType):
@@ -167,31 +376,42 @@ class ObjectType(ValueType):
 		self.type = cur_type
 		
 	def from_xml(self, node):
-		obj = self.type()
+		cur_type = self.type
+		context = state.context
+		if context.compact:
+			cur_type = compact_class(cur_type)
+		if context.interned is not None and cur_type.XML_INTERN:
+			return intern_object(cur_type, node, context.interned)
+		obj = cur_type()
 		obj.read_xml(node)
 		return obj
 	
 	def write_xml(self, node, obj):
 		obj.write_xml(node)
+	
+	def xml_matches(self, node):
+		return self.type.xml_matches(node)
 
 class FactoryType(ValueType):
 	def __init__(self, name, typeMap):
 		self.name = name
 		self.typeMap = typeMap
 		self.nameMap = {}
+		# {tag: value type}, resolved once
+		self.value_types = {}
 		for (key, value) in typeMap.items():
 			# Reverse lookup
 			self.nameMap[value] = key
+			self.value_types[key] = get_type(value)
 	
 	def from_xml(self, node):
-		cur_type = self.typeMap.get(node.tag)
-		if cur_type is None:
+		value_type = self.value_types.get(node.tag)
+		if value_type is None:
 			raise Exception("Invalid {} tag: {}".format(self.name, node.tag))
-		value_type = get_type(cur_type)
 		return value_type.from_xml(node)
 	
 	def get_name(self, obj):
-		cur_type = type(obj)
+		cur_type = get_base_class(type(obj))
 		name = self.nameMap.get(cur_type)
 		if name is None:
 			raise Exception("Invalid {} type: {}".format(self.name, cur_type))
@@ -201,18 +421,39 @@ class FactoryType(ValueType):
 		obj.write_xml(node)
 
 class DuckTypedFactory(ValueType):
+	"""
+	Value that may be any of the types in typeOrder. Types with an
+	xml_matches(node) predicate (see Object.xml_matches()) are checked first,
+	and the first match is parsed directly; if none matches or its parse
+	fails, each type is tried in order.
+	"""
 	def __init__(self, name, typeOrder):
 		self.name = name
 		assert len(typeOrder) > 0
 		self.type_order = typeOrder
+		# Resolved once, in the same order
+		self.value_types = [get_type(cur_type) for cur_type in typeOrder]
 	
 	def from_xml(self, node):
 		error_set = []
-		for value_type in self.type_order:
+		matched = None
+		for (cur_type, value_type) in zip(self.type_order, self.value_types):
+			matches = getattr(value_type, 'xml_matches', None)
+			if matches is not None and matches(node):
+				try:
+					return value_type.from_xml(node)
+				except Exception as e:
+					# Not tried again below
+					matched = value_type
+					error_set.append((cur_type, e))
+				break
+		for (cur_type, value_type) in zip(self.type_order, self.value_types):
+			if value_type is matched:
+				continue
 			try:
 				return value_type.from_xml(node)
 			except Exception as e:
-				error_set.append((value_type, e))
+				error_set.append((cur_type, e))
 		# Should have returned, we encountered errors
 		out = "Could not perform duck-typed parsing."
 		for (value_type, e) in error_set:
@@ -243,10 +484,10 @@ class Param(object):
 		self.required = required
 		self.is_aggregate = False
 	
-	def set_default(self):
+	def set_default(self, obj):
 		if self.required:
 			raise Exception("Required {} not set in XML: {}".format(self.type, self.xml_var))
-		elif not skip_default:
+		elif not get_skip_default():
 			setattr(obj, self.var, self.default)
 
 class Attribute(Param):
@@ -258,6 +499,14 @@ class Attribute(Param):
 		""" Node is the parent node in this case """
 		# Duplicate attributes cannot occur at this point
 		setattr(obj, self.var, self.value_type.from_string(value))
+	
+	def make_setter(self):
+		""" Closure equivalent to set_from_string(), for ParsePlan """
+		var = self.var
+		from_string = self.value_type.from_string
+		def setter(obj, value):
+			setattr(obj, var, from_string(value))
+		return setter
 		
 	def add_to_xml(self, obj, node):
 		value = getattr(obj, self.var)
@@ -265,7 +514,7 @@ class Attribute(Param):
 		if value is None:
 			if self.required:
 				raise Exception("Required attribute not set in object: {}".format(self.var))
-			elif not skip_default:
+			elif not get_skip_default():
 				value = self.default
 		# Allow value type to handle None?
 		if value is not None:
@@ -274,21 +523,44 @@ class Attribute(Param):
 # Add option if this requires a header? Like <joints> <joint/> .... </joints> ??? Not really... This would be a specific list type, not really aggregate
 
 class Element(Param):
-	def __init__(self, xml_var, value_type, required = True, default = None, var = None, is_raw = False):
+	"""
+	@param lazy: Whether parses with lazy = True (see ParseContext) may defer
+		decoding this element until it is accessed
+	"""
+	def __init__(self, xml_var, value_type, required = True, default = None, var = None, is_raw = False, lazy = False):
 		Param.__init__(self, xml_var, value_type, required, default, var)
 		self.type = 'element'
 		self.is_raw = is_raw
+		self.lazy = lazy
 		
 	def set_from_xml(self, obj, node):
+		if self.lazy and state.context.lazy:
+			defer_element(obj, self.var, node)
+			return
 		value = self.value_type.from_xml(node)
 		setattr(obj, self.var, value)
 	
+	def make_setter(self):
+		""" Closure equivalent to set_from_xml(), for ParsePlan """
+		var = self.var
+		from_xml = self.value_type.from_xml
+		if self.lazy:
+			def setter(obj, node):
+				if state.context.lazy:
+					defer_element(obj, var, node)
+				else:
+					setattr(obj, var, from_xml(node))
+		else:
+			def setter(obj, node):
+				setattr(obj, var, from_xml(node))
+		return setter
+	
 	def add_to_xml(self, obj, parent):
 		value = getattr(obj, self.xml_var)
 		if value is None:
 			if self.required:
 				raise Exception("Required element not defined in object: {}".format(self.var))
-			elif not skip_default:
+			elif not get_skip_default():
 				value = self.default
 		if value is not None:
 			self.add_scalar_to_xml(parent, value)
@@ -312,7 +584,15 @@ class AggregateElement(Element):
 		value = self.value_type.from_xml(node)
 		obj.add_aggregate(self.xml_var, value)
 	
-	def set_default(self):
+	def make_setter(self):
+		""" Closure equivalent to add_from_xml(), for ParsePlan """
+		xml_var = self.xml_var
+		from_xml = self.value_type.from_xml
+		def setter(obj, node):
+			obj.add_aggregate(xml_var, from_xml(node))
+		return setter
+	
+	def set_default(self, obj):
 		pass
 	
 
@@ -322,6 +602,122 @@ class Info:
 		self.attributes = list(node.attrib.keys())
 		self.children = xml_children(node)
 
+class ParsePlan(object):
+	"""
+	Flattened form of a Reflection, parent chain included, compiled once per
+	class. Attributes and child tags dispatch straight to setter closures, and
+	the consumed scalars are tracked with a bitmask, so parsing a node is a
+	single pass with no list copies.
+	Diagnostics are the same as Reflection's original path. The only difference
+	is that, for chained reflections, items are consumed in document order rather
+	than one reflection level at a time.
+	"""
+	def __init__(self, reflection, names = None):
+		"""
+		@param names: Only load these attributes and elements (see
+			ParseContext.profile); others are still checked, but not decoded
+		"""
+		self.names = names
+		chain = []
+		while reflection is not None:
+			chain.append(reflection)
+			reflection = reflection.parent
+		chain.reverse()
+		
+		# {xml_var: (bit, setter)}, bit is 0 for aggregates
+		self.attribute_setters = {}
+		self.element_setters = {}
+		# {tag: Element}
+		self.elements = {}
+		# Non-aggregate params, in the order defaults / requirements are handled
+		self.params = []
+		self.required_mask = 0
+		for reflection in chain:
+			for attribute in reflection.attributes:
+				self.add_param(self.attribute_setters, attribute)
+			for element in reflection.scalars:
+				self.add_param(self.element_setters, element)
+				self.elements.setdefault(element.xml_var, element)
+			for element in reflection.aggregates:
+				if element.xml_var not in self.element_setters:
+					self.element_setters[element.xml_var] = (0, self.make_setter(element))
+					self.elements[element.xml_var] = element
+	
+	def add_param(self, setters, param):
+		bit = 1 << len(self.params)
+		self.params.append((bit, param))
+		if param.required:
+			self.required_mask |= bit
+		# Parent reflections consume a name first
+		if param.xml_var not in setters:
+			setters[param.xml_var] = (bit, self.make_setter(param))
+	
+	def make_setter(self, param):
+		if self.names is None or param.xml_var in self.names:
+			return param.make_setter()
+		return skip_value
+	
+	def parse(self, obj, node):
+		(seen, unknown_attributes) = self.read_attributes(obj, node)
+		unknown_tags = None
+		for child in node:
+			if isinstance(child, etree._Comment):
+				continue
+			result = self.read_child(obj, child, seen)
+			if result is None:
+				if unknown_tags is None:
+					unknown_tags = []
+				unknown_tags.append(child.tag)
+			else:
+				seen = result
+		self.finish(obj, seen, unknown_attributes, unknown_tags)
+	
+	def read_attributes(self, obj, node):
+		""" Set all attributes of node, returning (seen mask, unknown names or None) """
+		attribute_setters = self.attribute_setters
+		seen = 0
+		unknown_attributes = None
+		for (xml_var, value) in node.attrib.items():
+			entry = attribute_setters.get(xml_var)
+			if entry is None:
+				if unknown_attributes is None:
+					unknown_attributes = []
+				unknown_attributes.append(xml_var)
+				continue
+			seen |= entry[0]
+			entry[1](obj, value)
+		return (seen, unknown_attributes)
+	
+	def read_child(self, obj, child, seen):
+		""" Consume one child element, returning the new seen mask, or None if the tag is unknown """
+		entry = self.element_setters.get(child.tag)
+		if entry is None:
+			return None
+		(bit, setter) = entry
+		if bit:
+			if seen & bit:
+				report_error("Scalar element defined multiple times: {}".format(child.tag))
+				return seen
+			seen |= bit
+		setter(obj, child)
+		return seen
+	
+	def finish(self, obj, seen, unknown_attributes = None, unknown_tags = None):
+		""" Handle defaults, missing required params and unknown names """
+		if (self.required_mask & ~seen) or not get_skip_default():
+			for (bit, param) in self.params:
+				if not seen & bit:
+					param.set_default(obj)
+		if unknown_attributes:
+			for xml_var in unknown_attributes:
+				report_error('Unknown attribute: {}'.format(xml_var))
+		if unknown_tags:
+			for tag in unknown_tags:
+				report_error('Unknown tag: {}'.format(tag))
+
+def skip_value(obj, value):
+	pass
+
 class Reflection(object):
 	def __init__(self, params = [], parent_cls = None, tag = None):
 		""" Construct a XML reflection thing
@@ -374,8 +770,47 @@ class Reflection(object):
 			else:
 				self.scalars.append(element)
 				self.scalarNames.append(element.xml_var)
+		
+		self.plan = None
+		self.projected_plans = {}
+	
+	def matches(self, node):
+		""" Whether node has all required names of this reflection, and no unknown ones """
+		plan = self.get_plan()
+		seen = 0
+		for xml_var in node.attrib:
+			entry = plan.attribute_setters.get(xml_var)
+			if entry is None:
+				return False
+			seen |= entry[0]
+		for child in node:
+			if isinstance(child, etree._Comment):
+				continue
+			entry = plan.element_setters.get(child.tag)
+			if entry is None:
+				return False
+			seen |= entry[0]
+		return not plan.required_mask & ~seen
+	
+	def get_plan(self, names = None):
+		"""
+		Compile (once) and return the ParsePlan for this reflection
+		@param names: Set of names to load, see ParseContext.profile
+		"""
+		if names is not None:
+			plan = self.projected_plans.get(names)
+			if plan is None:
+				plan = self.projected_plans[names] = ParsePlan(self, names)
+			return plan
+		if self.plan is None:
+			self.plan = ParsePlan(self)
+		return self.plan
 	
 	def set_from_xml(self, obj, node, info = None):
+		if info is None and use_parse_plans:
+			self.get_plan().parse(obj, node)
+			return
+		
 		is_final = False
 		if info is None:
 			is_final = True
@@ -409,20 +844,20 @@ class Reflection(object):
 						element.set_from_xml(obj, child)
 						unset_scalars.remove(tag)
 					else:
-						on_error("Scalar element defined multiple times: {}".format(tag))
+						report_error("Scalar element defined multiple times: {}".format(tag))
 				info.children.remove(child)
 		
 		for attribute in map(self.attribute_map.get, unset_attributes):
-			attribute.set_default()
+			attribute.set_default(obj)
 			
 		for element in map(self.element_map.get, unset_scalars):
-			element.set_default()
+			element.set_default(obj)
 		
 		if is_final:
 			for xml_var in info.attributes:
-				on_error('Unknown attribute: {}'.format(xml_var))
+				report_error('Unknown attribute: {}'.format(xml_var))
 			for node in info.children:
-				on_error('Unknown tag: {}'.format(node.tag))
+				report_error('Unknown tag: {}'.format(node.tag))
 	
 	def add_to_xml(self, obj, node):
 		if self.parent:
@@ -435,13 +870,215 @@ class Reflection(object):
 		if self.aggregates:
 			obj.add_aggregates_to_xml(node)
 
-class Object(YamlReflection):
+# Placeholder for removed values in AggregateList
+removed_value = object()
+
+class AggregateList(MutableSequence):
+	"""
+	List of aggregate values in insertion order, with O(1) append(), remove()
+	and membership tests; values must be hashable (as for aggregate_type).
+	Removed values leave a placeholder, dropped once they make up half of the
+	storage or when an index is needed.
+	Other edits (insert, item assignment, sort, ...) are O(n).
+	"""
+	__slots__ = ('items', 'positions', 'counts', 'removed')
+	
+	def __init__(self, values = ()):
+		self.set(values)
+	
+	def set(self, values):
+		""" Replace the contents with values """
+		self.items = list(values)
+		# {value: index of first occurrence}, {value: occurrences} when more than one
+		self.positions = {}
+		self.counts = {}
+		for (i, value) in enumerate(self.items):
+			if value in self.positions:
+				self.counts[value] = self.counts.get(value, 1) + 1
+			else:
+				self.positions[value] = i
+		self.removed = 0
+	
+	def compact(self):
+		if self.removed:
+			self.set([value for value in self.items if value is not removed_value])
+	
+	def __len__(self):
+		return len(self.items) - self.removed
+	
+	def __iter__(self):
+		if not self.removed:
+			return iter(self.items)
+		return (value for value in self.items if value is not removed_value)
+	
+	def __contains__(self, value):
+		return value in self.positions
+	
+	def __getitem__(self, i):
+		self.compact()
+		return self.items[i]
+	
+	def __setitem__(self, i, value):
+		self.compact()
+		items = list(self.items)
+		items[i] = value
+		self.set(items)
+	
+	def __delitem__(self, i):
+		self.compact()
+		items = list(self.items)
+		del items[i]
+		self.set(items)
+	
+	def insert(self, i, value):
+		if i >= len(self):
+			self.append(value)
+			return
+		self.compact()
+		items = list(self.items)
+		items.insert(i, value)
+		self.set(items)
+	
+	def append(self, value):
+		if value in self.positions:
+			self.counts[value] = self.counts.get(value, 1) + 1
+		else:
+			self.positions[value] = len(self.items)
+		self.items.append(value)
+	
+	def remove(self, value):
+		""" Remove the first occurrence of value """
+		i = self.positions.pop(value, None)
+		if i is None:
+			raise ValueError("Value not in aggregate list: {}".format(value))
+		self.items[i] = removed_value
+		self.removed += 1
+		count = self.counts.get(value)
+		if count is not None:
+			# Repeated values are rare, find the next one
+			if count > 2:
+				self.counts[value] = count - 1
+			else:
+				del self.counts[value]
+			self.positions[value] = next(j for j in range(i + 1, len(self.items)) if self.items[j] == value)
+		if self.removed * 2 > len(self.items):
+			self.compact()
+	
+	def index(self, value):
+		if value not in self.positions:
+			raise ValueError("Value not in aggregate list: {}".format(value))
+		self.compact()
+		return self.positions[value]
+	
+	def count(self, value):
+		if value not in self.positions:
+			return 0
+		return self.counts.get(value, 1)
+	
+	def sort(self, *args, **kwargs):
+		items = list(self)
+		items.sort(*args, **kwargs)
+		self.set(items)
+	
+	def reverse(self):
+		self.set(reversed(list(self)))
+	
+	def __eq__(self, other):
+		if isinstance(other, AggregateList):
+			other = list(other)
+		if not isinstance(other, list):
+			return NotImplemented
+		return list(self) == other
+	
+	def __ne__(self, other):
+		result = self.__eq__(other)
+		return result if result is NotImplemented else not result
+	
+	__hash__ = None
+	
+	def __add__(self, other):
+		return list(self) + list(other)
+	
+	def __radd__(self, other):
+		return list(other) + list(self)
+	
+	def __reduce__(self):
+		return (AggregateList, (list(self),))
+	
+	def __repr__(self):
+		return 'AggregateList({!r})'.format(list(self))
+
+class ObjectMeta(type):
+	"""
+	Metaclass of Object: a reflected class also counts as a base of the
+	classes generated from it (see compact_class(), frozen_class()), so
+	isinstance(link, urdf.Link) holds for compact and interned links too
+	"""
+	def __instancecheck__(cls, obj):
+		return type.__instancecheck__(cls, obj) or cls.__subclasscheck__(type(obj))
+	
+	def __subclasscheck__(cls, subclass):
+		if type.__subclasscheck__(cls, subclass):
+			return True
+		base = getattr(subclass, 'XML_BASE', None)
+		return base is not None and base is not subclass and type.__subclasscheck__(cls, base)
+
+# Same as declaring the metaclass, for Python 2 and 3
+ObjectBase = ObjectMeta('ObjectBase', (YamlReflection,), {'__slots__': ()})
+
+class Object(ObjectBase):
 	""" Raw python object for yaml / xml representation """
+	__slots__ = ()
 	XML_REFL = None
+	# Whether compact_class() may be used for this class
+	XML_COMPACT = True
+	# Whether parses with intern = True may share instances, see intern_object()
+	XML_INTERN = False
+	
+	def thaw(self):
+		""" Mutable version of this object: itself, or a copy for interned objects """
+		return self
 	
 	def get_refl_vars(self):
 		return self.XML_REFL.vars
 	
+	@classmethod
+	def xml_matches(cls, node):
+		"""
+		Cheap structural check of whether node describes this class, used by
+		DuckTypedFactory. By default, see Reflection.matches().
+		"""
+		return cls.XML_REFL.matches(node)
+	
+	def __getattr__(self, name):
+		""" Only called for missing attributes: decode a deferred element, see defer_element() """
+		if name == '_lazy':
+			raise AttributeError(name)
+		lazy = getattr(self, '_lazy', None)
+		if not lazy or name not in lazy:
+			raise AttributeError("'{}' object has no attribute '{}'".format(type(self).__name__, name))
+		(node, context) = lazy[name]
+		element = self.XML_REFL.get_plan().elements[node.tag]
+		with use_context(context):
+			value = element.value_type.from_xml(node)
+		setattr(self, name, value)
+		del lazy[name]
+		return value
+	
+	def materialize(self):
+		""" Decode all deferred elements, recursively """
+		lazy = getattr(self, '_lazy', None)
+		for name in list(lazy or []):
+			getattr(self, name)
+		if lazy:
+			# Names assigned before being decoded
+			lazy.clear()
+		for var in self.XML_REFL.vars:
+			value = getattr(self, var, None)
+			for item in value if isinstance(value, (list, AggregateList)) else [value]:
+				if isinstance(item, Object):
+					item.materialize()
+	
 	def check_valid(self):
 		pass
 	
@@ -465,42 +1102,136 @@ class Object(YamlReflection):
 		return doc
 	
 	def to_xml_string(self):
+		if use_fast_writer:
+			from urdf_parser_py.xml_reflection import writer
+			return writer.to_xml_string(self)
 		return xml_string(self.to_xml())
 	
+	def to_xml_file(self, f):
+		""" Write to_xml_string() to a path or file object, without building the whole text """
+		from urdf_parser_py.xml_reflection import writer
+		writer.to_xml_file(self, f)
+	
 	def post_read_xml(self):
 		pass
 	
 	def read_xml(self, node):
+		names = state.context.get_profile(node)
+		if names is not None:
+			self.XML_REFL.get_plan(names).parse(self, node)
+			self.post_read_xml()
+			return
 		self.XML_REFL.set_from_xml(self, node)
 		self.post_read_xml()
 		self.check_valid()
 		
 	@classmethod
-	def from_xml(cls, node):
-		cur_type = get_type(cls)
-		return cur_type.from_xml(node)
+	def from_xml(cls, node, **options):
+		"""
+		@param options: See ParseContext, or context = a ParseContext to use
+			(i.e. one per thread, with its own on_error and diagnostics)
+		"""
+		cur_type = get_object_type(cls)
+		with parse_context(**options) as context:
+			obj = cur_type.from_xml(node)
+			if options and context.pack_floats:
+				pack_floats(obj)
+		return obj
 	
 	@classmethod
-	def from_xml_string(cls, xml_string):
+	def from_xml_string(cls, xml_string, **options):
 		node = etree.fromstring(xml_string)
-		return cls.from_xml(node)
+		return cls.from_xml(node, **options)
 	
 	@classmethod
-	def from_xml_file(cls, file_path):
+	def from_xml_file(cls, file_path, **options):
 		xml_string= open(file_path, 'r').read()
-		return cls.from_xml_string(xml_string)
+		return cls.from_xml_string(xml_string, **options)
+	
+	@classmethod
+	def from_xml_file_async(cls, file_path, **options):
+		""" Coroutine (Python 3) for from_xml_file(), reading and parsing in executors, see aio.Loader """
+		from urdf_parser_py import aio
+		return aio.Loader(aio.FileSource(), cls = cls, **options).load(file_path)
+	
+	@classmethod
+	def from_xml_stream(cls, source, **options):
+		""" Incremental counterpart of from_xml_file(), see iter_xml_stream() """
+		with parse_context(**options) as context:
+			if context.compact:
+				obj = compact_class(cls)()
+			else:
+				obj = cls()
+			for value in obj.iter_xml_stream(source):
+				pass
+			if options and context.pack_floats:
+				pack_floats(obj)
+		return obj
+	
+	def iter_xml_stream(self, source):
+		"""
+		Load this object from a file path or binary file object with
+		lxml.etree.iterparse, yielding each top-level value as soon as its
+		element has closed. Consumed elements are then dropped from the
+		document, so memory tracks the largest single element rather than
+		the whole file (raw values, such as <gazebo> blocks, and deferred
+		elements of lazy parses keep their node).
+		"""
+		plan = None
+		root = None
+		depth = 0
+		seen = 0
+		unknown_attributes = None
+		unknown_tags = None
+		for (event, node) in etree.iterparse(source, events = ('start', 'end')):
+			if event == 'start':
+				if root is None:
+					root = node
+					plan = self.XML_REFL.get_plan(state.context.get_profile(node))
+					(seen, unknown_attributes) = plan.read_attributes(self, node)
+				depth += 1
+				continue
+			depth -= 1
+			if depth != 1:
+				continue
+			result = plan.read_child(self, node, seen)
+			if result is None:
+				if unknown_tags is None:
+					unknown_tags = []
+				unknown_tags.append(node.tag)
+				value = None
+			else:
+				seen = result
+				element = plan.elements[node.tag]
+				if plan.names is not None and node.tag not in plan.names:
+					value = None
+				elif element.is_aggregate:
+					value = self.get_aggregate_list(node.tag)[-1]
+				else:
+					value = getattr(self, element.var)
+			# Drop everything consumed so far; the parser only appends past this point
+			if value is not node and not state.context.lazy:
+				node.clear()
+			while node.getprevious() is not None:
+				del root[0]
+			if value is not None:
+				yield value
+		plan.finish(self, seen, unknown_attributes, unknown_tags)
+		self.post_read_xml()
+		if plan.names is None:
+			self.check_valid()
 
 	# Confusing distinction between loading code in object and reflection registry thing...
 
 	def get_aggregate_list(self, xml_var):
 		var = self.XML_REFL.paramMap[xml_var].var
-		values = getattr(self, var)
-		assert isinstance(values, list)
-		return values
+		return getattr(self, var)
 		
 	def aggregate_init(self):
-		""" Must be called in constructor! """
-		self.aggregate_order = []
+		""" Must be called in constructor! Sets an empty AggregateList for each aggregate """
+		for param in self.XML_REFL.aggregates:
+			setattr(self, param.var, AggregateList())
+		self.aggregate_order = AggregateList()
 		# Store this info in the loaded object??? Nah
 		self.aggregate_type = {}
 		
@@ -518,17 +1249,19 @@ class Object(YamlReflection):
 			element.add_scalar_to_xml(node, value)
 	
 	def remove_aggregate(self, obj):
+		""" Remove an object added with add_aggregate(), in O(1) """
+		xml_var = self.aggregate_type.pop(obj)
 		self.aggregate_order.remove(obj)
-		xml_var = self.aggregate_type[obj]
-		del self.aggregate_type[obj]
 		self.get_aggregate_list(xml_var).remove(obj)
 	
 	def lump_aggregates(self):
 		""" Put all aggregate types together, just because """
-		self.aggregate_init()
+		self.aggregate_order = AggregateList()
+		self.aggregate_type = {}
 		for param in self.XML_REFL.aggregates:
 			for obj in self.get_aggregate_list(param.xml_var):
-				self.add_aggregate(param.var, obj)
+				self.aggregate_order.append(obj)
+				self.aggregate_type[obj] = param.xml_var
 	
 	""" Compatibility """
 	def parse(self, xml_string):
@@ -536,6 +1269,163 @@ class Object(YamlReflection):
 		self.read_xml(node)
 		return self
 
+def pack_floats(obj):
+	"""
+	Pack the floats of obj into a storage.FloatBuffer, returned and stored as
+	obj.float_buffer unless obj is slot-based (see compact_class())
+	"""
+	from urdf_parser_py.xml_reflection import storage
+	float_buffer = storage.FloatBuffer(obj)
+	if hasattr(obj, '__dict__'):
+		obj.float_buffer = float_buffer
+	return float_buffer
+
+def defer_element(obj, var, node):
+	""" Keep node for var of obj, to be decoded on first access instead of now """
+	lazy = getattr(obj, '_lazy', None)
+	if lazy is None:
+		lazy = obj._lazy = {}
+	lazy[var] = (node, state.context)
+	try:
+		delattr(obj, var)
+	except AttributeError:
+		pass
+
+compact_classes = {}
+
+def compact_class(cls):
+	"""
+	Slot-based equivalent of an Object subclass: same methods, properties and
+	reflection, but no per-instance __dict__. Slots are the reflection vars
+	plus whatever the constructor sets (i.e. aggregate bookkeeping).
+	"""
+	compact = compact_classes.get(cls)
+	if compact is not None:
+		return compact
+	if not cls.XML_COMPACT:
+		compact_classes[cls] = cls
+		return cls
+	namespace = {}
+	for klass in reversed(cls.__mro__):
+		if klass in Object.__mro__:
+			continue
+		namespace.update(klass.__dict__)
+	for key in ['__dict__', '__weakref__', '__slots__', 'XML_TYPE']:
+		namespace.pop(key, None)
+	names = set(cls.XML_REFL.vars) | set(vars(cls())) | set(['_lazy'])
+	# Class-level defaults would conflict with slots
+	for name in names:
+		namespace.pop(name, None)
+	namespace['__slots__'] = tuple(sorted(names))
+	namespace['__reduce__'] = reduce_compact
+	namespace['__setstate__'] = set_state
+	namespace['XML_BASE'] = cls
+	compact = type('Compact' + cls.__name__, (Object,), namespace)
+	compact_classes[cls] = compact
+	return compact
+
+def new_compact(cls):
+	return compact_class(cls)()
+
+def reduce_compact(obj):
+	""" Pickle compact objects through their base class, since generated classes cannot be imported """
+	return (new_compact, (obj.XML_BASE,), get_state(obj))
+
+def get_state(obj):
+	""" Instance variables of obj, from its __dict__ and / or slots """
+	state = dict(getattr(obj, '__dict__', {}))
+	for klass in type(obj).__mro__:
+		for name in klass.__dict__.get('__slots__', ()):
+			if hasattr(obj, name):
+				state[name] = getattr(obj, name)
+	return state
+
+def set_state(obj, state):
+	for (name, value) in state.items():
+		object.__setattr__(obj, name, value)
+
+frozen_classes = {}
+
+def frozen_class(cls):
+	""" Read-only subclass of cls (a reflected or compact class) for interned objects """
+	frozen = frozen_classes.get(cls)
+	if frozen is None:
+		base = get_base_class(cls)
+		frozen = type('Frozen' + base.__name__, (cls,), {
+			'__slots__': (),
+			'__setattr__': set_frozen,
+			'__delattr__': set_frozen,
+			'__reduce__': reduce_frozen,
+			'__setstate__': set_state,
+			'thaw': thaw_frozen,
+			'XML_MUTABLE': cls,
+			'XML_BASE': base,
+			'__module__': base.__module__,
+			})
+		frozen_classes[cls] = frozen
+	return frozen
+
+def set_frozen(obj, name, *args):
+	raise Exception("Cannot set {} on interned {}, replace it with a copy from thaw()".format(name,
+		obj.XML_BASE.__name__))
+
+def thaw_frozen(obj):
+	""" Mutable copy of an interned object, with list vectors unless it is compact """
+	cls = obj.XML_MUTABLE
+	copy = cls.__new__(cls)
+	state = get_state(obj)
+	if cls is obj.XML_BASE:
+		for (name, value) in state.items():
+			if isinstance(value, tuple):
+				state[name] = list(value)
+	set_state(copy, state)
+	return copy
+
+def new_frozen(cls, compact):
+	if compact:
+		cls = compact_class(cls)
+	return object.__new__(frozen_class(cls))
+
+def reduce_frozen(obj):
+	return (new_frozen, (obj.XML_BASE, obj.XML_MUTABLE is not obj.XML_BASE), get_state(obj))
+
+def get_structure_key(node):
+	""" Hashable key equal for structurally identical nodes """
+	children = tuple(get_structure_key(child) for child in node if isinstance(child.tag, str))
+	return (node.tag, tuple(sorted(node.attrib.items())), (node.text or '').strip(), children)
+
+def intern_object(cur_type, node, interned):
+	"""
+	Parse node into a frozen cur_type, shared with previously parsed identical
+	nodes through the interned table. Interned objects raise on assignment;
+	to change one, replace it with obj.thaw(). Nodes with unknown attributes
+	or elements are parsed into regular objects so they are still reported.
+	"""
+	plan = cur_type.XML_REFL.get_plan()
+	for name in node.attrib:
+		if name not in plan.attribute_setters:
+			break
+	else:
+		for child in node:
+			if isinstance(child.tag, str) and child.tag not in plan.element_setters:
+				break
+		else:
+			key = (cur_type, state.context.get_intern_key(node), get_structure_key(node))
+			obj = interned.get(key)
+			if obj is None:
+				obj = cur_type()
+				obj.read_xml(node)
+				object.__setattr__(obj, '__class__', frozen_class(cur_type))
+				interned[key] = obj
+			return obj
+	obj = cur_type()
+	obj.read_xml(node)
+	return obj
+
+def get_base_class(cur_type):
+	""" Reflected class of cur_type, the original class for generated ones """
+	return getattr(cur_type, 'XML_BASE', None) or cur_type
+
 # Really common types
 # Better name: element_with_name? Attributed element?
 add_type('element_name', SimpleElementType('name', str))
@@ -0,0 +1,139 @@
+import numpy
+
+from urdf_parser_py.xml_reflection import core
+
+# Contiguous storage for the float values of a parsed object graph, see
+# FloatBuffer. Used by Object.from_xml(..., pack_floats = True), or directly.
+
+# Kinds of values
+OTHER = 0 # Possibly an Object to recurse into
+SCALAR = 1
+VECTOR = 2
+
+def get_kind(value_type):
+	if isinstance(value_type, core.SimpleElementType):
+		value_type = value_type.value_type
+	if isinstance(value_type, core.VectorType):
+		return VECTOR
+	if isinstance(value_type, core.BasicType):
+		return SCALAR if value_type.type is float else None
+	return OTHER
+
+plans = {}
+
+def get_plan(reflection):
+	""" ([(var, kind)], [aggregate xml_var]) for the reflection chain, cached """
+	plan = plans.get(reflection)
+	if plan is None:
+		chain = []
+		while reflection is not None:
+			chain.insert(0, reflection)
+			reflection = reflection.parent
+		params = []
+		aggregates = []
+		for level in chain:
+			for param in level.attributes + level.scalars:
+				kind = get_kind(param.value_type)
+				if kind is not None:
+					params.append((param.var, kind))
+			aggregates += [param.xml_var for param in level.aggregates]
+		plan = plans[chain[-1]] = (params, aggregates)
+	return plan
+
+def replace_aggregate(obj, aggregate_list, i, value):
+	""" Put value in place of aggregate_list[i], keeping obj's aggregate order """
+	old = aggregate_list[i]
+	aggregate_list[i] = value
+	if old in obj.aggregate_type:
+		order = obj.aggregate_order
+		order[order.index(old)] = value
+		obj.aggregate_type[value] = obj.aggregate_type.pop(old)
+
+class FloatBuffer(object):
+	"""
+	All float values reachable from an object (vector and float attributes,
+	and simple float elements) packed into one float64 array. Each value is
+	replaced by a view into it: a 1-d slice for vectors, a 0-d array for
+	scalars. Writes through views change the array and the reverse.
+	Assigning a new value to an attribute detaches it from the buffer.
+
+	The array supports the buffer protocol (memoryview(buffer.array)), and
+	bind() moves all views to another array of the same size, i.e. one from
+	numpy.load(path, mmap_mode = 'r+') or in shared memory.
+	Deferred elements of lazy parses are decoded while packing, and interned
+	objects are replaced by copies (see Object.thaw()) so that shared
+	instances are not bound to this buffer.
+	"""
+	def __init__(self, obj):
+		if obj.thaw() is not obj:
+			raise Exception("Cannot pack the floats of an interned {}, use a copy from thaw()".format(type(obj).__name__))
+		# [(object, var, offset, size)], size is None for scalars
+		self.layout = []
+		values = []
+		self.collect(obj, values, set())
+		self.size = len(values)
+		self.bind(numpy.array(values, dtype = float))
+
+	def collect(self, obj, values, visited):
+		if id(obj) in visited:
+			return
+		visited.add(id(obj))
+		(params, aggregates) = get_plan(obj.XML_REFL)
+		for (var, kind) in params:
+			value = getattr(obj, var, None)
+			if value is None:
+				continue
+			if kind == VECTOR:
+				self.layout.append((obj, var, len(values), len(value)))
+				values.extend(value)
+			elif kind == SCALAR:
+				self.layout.append((obj, var, len(values), None))
+				values.append(value)
+			elif isinstance(value, core.Object):
+				copy = value.thaw()
+				if copy is not value:
+					object.__setattr__(obj, var, copy)
+				self.collect(copy, values, visited)
+		for xml_var in aggregates:
+			aggregate_list = obj.get_aggregate_list(xml_var)
+			for (i, value) in enumerate(list(aggregate_list)):
+				if isinstance(value, core.Object):
+					copy = value.thaw()
+					if copy is not value:
+						replace_aggregate(obj, aggregate_list, i, copy)
+					self.collect(copy, values, visited)
+
+	def bind(self, array):
+		""" Use array (of the same size) as the storage of all values """
+		if array.shape != (self.size,):
+			raise Exception("Float buffer size mismatch: {} instead of {}".format(array.shape, (self.size,)))
+		self.array = array
+		for (obj, var, offset, size) in self.layout:
+			if size is None:
+				value = array[offset:offset + 1].reshape(())
+			else:
+				value = array[offset:offset + size]
+			# Interned objects are read-only
+			object.__setattr__(obj, var, value)
+
+	def get_offset(self, obj, var):
+		""" (offset, size) of obj.var in the array """
+		for (other, other_var, offset, size) in self.layout:
+			if other is obj and other_var == var:
+				return (offset, size)
+		raise KeyError(var)
+
+	def save(self, path):
+		numpy.save(path, self.array)
+
+	def load(self, path, mmap_mode = 'r+'):
+		""" Bind to an array saved with save(), memory-mapped by default """
+		self.bind(numpy.load(path, mmap_mode = mmap_mode))
+
+	def __getstate__(self):
+		return {'layout': self.layout, 'size': self.size, 'array': numpy.array(self.array)}
+
+	def __setstate__(self, state):
+		self.layout = state['layout']
+		self.size = state['size']
+		self.bind(state['array'])
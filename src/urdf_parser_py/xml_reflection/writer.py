@@ -0,0 +1,308 @@
+import io
+import re
+
+from urdf_parser_py.xml_reflection.basics import *
+from urdf_parser_py.xml_reflection import core
+
+# Direct text serialization of reflected objects, see Object.to_xml_string() and
+# Object.to_xml_file(). The output matches
+# xml_string(obj.to_xml()), i.e. lxml's pretty printing, without building the
+# tree. Value types the writer does not know are written through lxml as a
+# subtree; custom value types can avoid that by defining
+# write_stream(writer, tag, value), see urdf.GeometricType.
+
+HEADER = '<?xml version="1.0"?>\n'
+INDENT = '  '
+# Pieces buffered before writing to a file
+BUFFER_SIZE = 4096
+
+# States of an open element
+PENDING = 0 # Start tag not written yet, attributes may still be added
+TEXT = 1
+CHILDREN = 2
+
+def to_ascii(text):
+	""" Native ASCII string, with character references like lxml's default encoding """
+	if isinstance(text, str):
+		if bytes is str:
+			return text
+		return text.encode('ascii', 'xmlcharrefreplace').decode('ascii')
+	if isinstance(text, bytes):
+		return text.decode('ascii')
+	return text.encode('ascii', 'xmlcharrefreplace')
+
+# Characters that need escaping, or character references outside of ASCII
+text_special = re.compile(u'[&<>\r]|[^\x00-\x7f]')
+attribute_special = re.compile(u'[&<>"\n\r\t]|[^\x00-\x7f]')
+
+def escape_text(text):
+	if not text_special.search(text):
+		return str(text)
+	text = text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('\r', '&#13;')
+	return to_ascii(text)
+
+def escape_attribute(text):
+	if not attribute_special.search(text):
+		return str(text)
+	text = text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;')
+	text = text.replace('\n', '&#10;').replace('\r', '&#13;').replace('\t', '&#9;')
+	return to_ascii(text)
+
+def format_attribute(name, text):
+	return ' ' + name + '="' + escape_attribute(text) + '"'
+
+def node_string(node, level, pretty):
+	"""
+	lxml serialization of node as it would appear at the given depth of a
+	document, without leading indentation or trailing newline.
+	"""
+	if not pretty:
+		return to_ascii(etree.tostring(node))
+	if level == 0:
+		return to_ascii(etree.tostring(node, pretty_print = True))[:-1]
+	# Nest it in placeholders so lxml indents it for the right depth
+	root = parent = etree.Element('x')
+	for i in range(level - 1):
+		parent = etree.SubElement(parent, 'x')
+	parent.append(node)
+	text = to_ascii(etree.tostring(root, pretty_print = True))
+	prefix = sum(len(INDENT * i + '<x>\n') for i in range(level))
+	suffix = sum(len(INDENT * i + '</x>\n') for i in range(level))
+	return text[prefix + len(INDENT * level):-suffix - 1]
+
+class XmlWriter(object):
+	"""
+	Incremental XML text output, formatted like etree.tostring(node,
+	pretty_print = True). Elements are opened with start(), given attributes
+	while nothing else was written in them, then text or child elements,
+	and closed with end().
+	@param write: Function taking each piece of (native string) text
+	"""
+	def __init__(self, write):
+		self.write = write
+		# [tag, start tag text so far, state, pretty]
+		self.stack = []
+
+	def start(self, tag, attributes = ''):
+		""" @param attributes: Already formatted attributes, see format_attribute() """
+		pretty = self.open_child()
+		self.stack.append([tag, '<' + tag + attributes, PENDING, pretty])
+
+	def attribute(self, name, text):
+		top = self.stack[-1]
+		if top[2] != PENDING:
+			raise Exception("Attribute after contents of element: {}".format(top[0]))
+		top[1] += format_attribute(name, text)
+
+	def text(self, text):
+		top = self.stack[-1]
+		if top[2] != PENDING:
+			raise Exception("Text must come first in element: {}".format(top[0]))
+		self.write(top[1] + '>' + escape_text(text))
+		top[2] = TEXT
+		# lxml does not indent mixed content
+		top[3] = False
+
+	def end(self):
+		(tag, start, state, pretty) = self.stack.pop()
+		if state == PENDING:
+			self.write(start + '/>')
+		elif state == CHILDREN and pretty:
+			self.write(INDENT * len(self.stack) + '</' + tag + '>')
+		else:
+			self.write('</' + tag + '>')
+		self.close_child()
+
+	def empty(self, tag, attributes = ''):
+		""" Same as start(tag, attributes) then end() """
+		self.open_child()
+		self.write('<' + tag + attributes + '/>')
+		self.close_child()
+
+	def node(self, node):
+		""" Write an lxml element and its subtree """
+		pretty = self.open_child()
+		self.write(node_string(node, len(self.stack), pretty))
+		self.close_child()
+
+	def open_child(self):
+		""" Prepare for a child element in the current one, returning whether it is pretty printed """
+		if not self.stack:
+			return True
+		top = self.stack[-1]
+		if top[2] == PENDING:
+			self.write(top[1] + ('>\n' if top[3] else '>'))
+		top[2] = CHILDREN
+		if top[3]:
+			self.write(INDENT * len(self.stack))
+		return top[3]
+
+	def close_child(self):
+		if not self.stack or self.stack[-1][3]:
+			self.write('\n')
+
+	def write_object(self, tag, obj):
+		""" Write an element for a reflected object, like obj.write_xml(node) """
+		plan = get_plan(type(obj))
+		if plan is None:
+			node = etree.Element(tag)
+			obj.write_xml(node)
+			self.node(node)
+			return
+		obj.check_valid()
+		obj.pre_write_xml()
+		attributes = []
+		for (xml_var, var, required, default, to_string) in plan.attributes:
+			value = getattr(obj, var)
+			if value is None:
+				if required:
+					raise Exception("Required attribute not set in object: {}".format(var))
+				elif not core.get_skip_default():
+					value = default
+			if value is not None:
+				attributes.append(format_attribute(xml_var, to_string(value)))
+		if not plan.elements:
+			self.empty(tag, ''.join(attributes))
+			return
+		self.start(tag, ''.join(attributes))
+		for (element, write) in plan.elements:
+			if element is None:
+				self.write_aggregates(obj)
+				continue
+			value = getattr(obj, element.xml_var)
+			if value is None:
+				if element.required:
+					raise Exception("Required element not defined in object: {}".format(element.var))
+				elif not core.get_skip_default():
+					value = element.default
+			if value is not None:
+				write(self, value)
+		self.end()
+
+	def write_aggregates(self, obj):
+		element_map = obj.XML_REFL.element_map
+		for value in obj.aggregate_order:
+			element = element_map[obj.aggregate_type[value]]
+			get_element_writer(element)(self, value)
+
+def get_function(method):
+	return getattr(method, '__func__', method)
+
+def is_overridden(cls, name, base):
+	return get_function(getattr(cls, name)) is not get_function(getattr(base, name))
+
+def make_element_writer(element):
+	""" Function (writer, value) equivalent to element.add_scalar_to_xml(node, value) """
+	value_type = element.value_type
+	tag = element.xml_var
+	if element.is_raw:
+		def write(writer, value):
+			raise Exception("Raw elements are not supported by the writer: {}".format(tag))
+	elif hasattr(value_type, 'write_stream'):
+		def write(writer, value):
+			value_type.write_stream(writer, tag, value)
+	elif isinstance(value_type, (core.ObjectType, core.FactoryType, core.DuckTypedFactory)):
+		def write(writer, value):
+			writer.write_object(tag, value)
+	elif isinstance(value_type, core.SimpleElementType):
+		attribute = value_type.attribute
+		to_string = value_type.value_type.to_string
+		def write(writer, value):
+			writer.start(tag)
+			writer.attribute(attribute, to_string(value))
+			writer.end()
+	elif not is_overridden(type(value_type), 'write_xml', core.ValueType):
+		to_string = value_type.to_string
+		def write(writer, value):
+			writer.start(tag)
+			writer.text(to_string(value))
+			writer.end()
+	else:
+		def write(writer, value):
+			node = etree.Element(tag)
+			value_type.write_xml(node, value)
+			writer.node(node)
+	return write
+
+element_writers = {}
+
+def get_element_writer(element):
+	write = element_writers.get(element)
+	if write is None:
+		write = element_writers[element] = make_element_writer(element)
+	return write
+
+class WritePlan(object):
+	"""
+	Flattened reflection of a class for XmlWriter.write_object(): attributes
+	of the whole parent chain, then elements, with None standing for the
+	aggregates.
+	"""
+	def __init__(self, reflection):
+		chain = []
+		while reflection is not None:
+			chain.insert(0, reflection)
+			reflection = reflection.parent
+		self.attributes = []
+		self.elements = []
+		for reflection in chain:
+			for attribute in reflection.attributes:
+				self.attributes.append((attribute.xml_var, attribute.var, attribute.required,
+					attribute.default, attribute.value_type.to_string))
+			for element in reflection.scalars:
+				self.elements.append((element, get_element_writer(element)))
+			if reflection.aggregates:
+				self.elements.append((None, None))
+		self.supported = not any(element.is_raw for reflection in chain
+			for element in reflection.scalars + reflection.aggregates)
+
+plans = {}
+
+def get_plan(cls):
+	""" WritePlan for cls, or None if its objects must be written through lxml """
+	try:
+		return plans[cls]
+	except KeyError:
+		pass
+	plan = WritePlan(cls.XML_REFL)
+	if not plan.supported or is_overridden(cls, 'write_xml', core.Object) \
+			or is_overridden(cls, 'add_aggregates_to_xml', core.Object):
+		plan = None
+	plans[cls] = plan
+	return plan
+
+def write_xml(obj, write, header = True):
+	""" Write the document for obj to the function write """
+	tag = obj.XML_REFL.tag
+	assert tag is not None, "Must define 'tag' in reflection to use this function"
+	if header:
+		write(HEADER)
+	XmlWriter(write).write_object(tag, obj)
+
+def to_xml_string(obj):
+	parts = []
+	write_xml(obj, parts.append)
+	return ''.join(parts)
+
+def to_text(text):
+	return text.decode('ascii') if isinstance(text, bytes) else text
+
+def to_bytes(text):
+	return text if isinstance(text, bytes) else text.encode('ascii')
+
+def to_xml_file(obj, f):
+	""" Write the document for obj to a path or file object, text or binary """
+	if isstring(f):
+		with open(f, 'w') as output:
+			return to_xml_file(obj, output)
+	convert = to_text if isinstance(f, io.TextIOBase) else to_bytes
+	parts = []
+	def flush():
+		f.write(convert(''.join(parts)))
+		del parts[:]
+	def write(text):
+		parts.append(text)
+		if len(parts) >= BUFFER_SIZE:
+			flush()
+	write_xml(obj, write)
+	flush()
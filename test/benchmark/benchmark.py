@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+"""
+Parse / serialize benchmarks for urdf_parser_py.
+
+Measures, for small, medium (romeo) and generated large robots:
+Robot.from_xml_string, to_xml_string and str() / to_yaml() times, and peak
+memory of a parse; plus the import time of urdf_parser_py.urdf.
+Results are written as JSON and can be compared against a stored baseline:
+
+	./benchmark.py -o baseline.json
+	./benchmark.py --baseline baseline.json   # exits 1 on regressions
+"""
+from __future__ import print_function
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+
+try:
+	import tracemalloc
+except ImportError:
+	tracemalloc = None
+
+from urdf_parser_py import urdf
+import urdf_parser_py
+
+TEST_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def generate_robot(link_count, branching = 2):
+	""" URDF text for a tree of link_count links with inertials, visuals and collisions """
+	lines = ['<?xml version="1.0"?>', '<robot name="generated">']
+	for i in range(link_count):
+		lines.append('''  <link name="link{0}">
+    <inertial>
+      <origin xyz="0 0 0.1" rpy="0 0 0"/>
+      <mass value="1.5"/>
+      <inertia ixx="0.01" ixy="0" ixz="0" iyy="0.01" iyz="0" izz="0.01"/>
+    </inertial>
+    <visual>
+      <origin xyz="0 0 0" rpy="0 0 0"/>
+      <geometry><mesh filename="package://generated/meshes/link{0}.dae" scale="1 1 1"/></geometry>
+      <material name="grey"><color rgba="0.5 0.5 0.5 1"/></material>
+    </visual>
+    <collision>
+      <origin xyz="0 0 0" rpy="0 0 0"/>
+      <geometry><cylinder radius="0.05" length="0.2"/></geometry>
+    </collision>
+  </link>'''.format(i))
+		if i > 0:
+			lines.append('''  <joint name="joint{0}" type="revolute">
+    <parent link="link{1}"/>
+    <child link="link{0}"/>
+    <origin xyz="0 0 0.2" rpy="0 0 0"/>
+    <axis xyz="0 0 1"/>
+    <limit effort="10" velocity="1" lower="-1.57" upper="1.57"/>
+  </joint>'''.format(i, (i - 1) // branching))
+	lines.append('</robot>')
+	return '\n'.join(lines)
+
+def read_file(*path):
+	with open(os.path.join(TEST_DIR, *path), 'rb') as f:
+		return f.read()
+
+CASES = {
+	'small': lambda options: generate_robot(10),
+	'romeo': lambda options: read_file('romeo', 'romeo.urdf'),
+	'large': lambda options: generate_robot(options.large_links),
+	}
+
+def measure(func, repeat):
+	""" {'best', 'mean'} seconds over repeat calls """
+	times = []
+	for i in range(repeat):
+		start = time.time()
+		func()
+		times.append(time.time() - start)
+	return {'best': min(times), 'mean': sum(times) / len(times), 'unit': 's'}
+
+def measure_peak_memory(func):
+	if tracemalloc is None:
+		return None
+	tracemalloc.start()
+	try:
+		func()
+		(current, peak) = tracemalloc.get_traced_memory()
+	finally:
+		tracemalloc.stop()
+	return {'best': peak, 'mean': peak, 'unit': 'bytes'}
+
+def measure_import(repeat):
+	code = 'import time; start = time.time(); import urdf_parser_py.urdf; print(time.time() - start)'
+	times = []
+	for i in range(repeat):
+		output = subprocess.check_output([sys.executable, '-c', code], env = os.environ)
+		times.append(float(output.strip()))
+	return {'best': min(times), 'mean': sum(times) / len(times), 'unit': 's'}
+
+def run_case(xml_string, repeat):
+	results = {}
+	try:
+		robot = urdf.Robot.from_xml_string(xml_string)
+	except Exception as e:
+		return {'error': 'from_xml_string: {}'.format(e)}
+	size = len(xml_string)
+	results['from_xml_string'] = measure(lambda: urdf.Robot.from_xml_string(xml_string), repeat)
+	results['from_xml_string']['throughput'] = size / results['from_xml_string']['best']
+	benchmarks = [
+		('to_xml_string', robot.to_xml_string),
+		('str', lambda: str(robot)),
+		('to_yaml', robot.to_yaml),
+		]
+	for (name, func) in benchmarks:
+		try:
+			results[name] = measure(func, repeat)
+		except Exception as e:
+			results[name] = {'error': '{}: {}'.format(type(e).__name__, e)}
+	peak = measure_peak_memory(lambda: urdf.Robot.from_xml_string(xml_string))
+	if peak is not None:
+		results['peak_memory'] = peak
+	results['size'] = size
+	results['links'] = len(robot.links)
+	return results
+
+def run(options):
+	report = {
+		'python': platform.python_version(),
+		'platform': platform.platform(),
+		'version': urdf_parser_py.__version__,
+		'time': time.time(),
+		'cases': {},
+		}
+	for name in options.cases:
+		xml_string = CASES[name](options)
+		repeat = options.repeat if name != 'large' else max(1, options.repeat // 5)
+		results = run_case(xml_string, repeat)
+		report['cases'][name] = results
+		errors = [(metric, result['error']) for (metric, result) in results.items()
+			if isinstance(result, dict) and 'error' in result]
+		if 'error' in results:
+			errors.append(('case', results['error']))
+		for (metric, error) in errors:
+			print('{}: {} failed: {}'.format(name, metric, error), file = sys.stderr)
+		print('{}: done'.format(name), file = sys.stderr)
+	report['import'] = measure_import(options.repeat)
+	return report
+
+def iter_metrics(report):
+	""" ((case, metric), result) for all timed / memory results """
+	for (case, results) in report['cases'].items():
+		for (metric, result) in results.items():
+			if isinstance(result, dict) and 'best' in result:
+				yield ((case, metric), result)
+	if 'import' in report:
+		yield (('import', 'import'), report['import'])
+
+def get_failure(report, key):
+	""" Why a metric has no result in report: its error, or 'missing' """
+	results = report['cases'].get(key[0], {})
+	result = results.get(key[1])
+	if isinstance(result, dict) and 'error' in result:
+		return result['error']
+	return results.get('error', 'missing')
+
+def compare(report, baseline, tolerance):
+	"""
+	Print a comparison table, returning the list of regressed (case, metric).
+	Metrics of the baseline that are missing or failed in report, for the
+	cases it ran, are regressions too.
+	"""
+	old = dict(iter_metrics(baseline))
+	new = dict(iter_metrics(report))
+	regressions = []
+	for key in sorted(set(old) | set(new)):
+		previous = old.get(key)
+		result = new.get(key)
+		if result is None:
+			if key[0] != 'import' and key[0] not in report['cases']:
+				continue
+			regressions.append(key)
+			print('{:<8} {:<16} {}  REGRESSION'.format(key[0], key[1], get_failure(report, key)))
+			continue
+		if previous is None or not previous['best']:
+			continue
+		ratio = result['best'] / previous['best']
+		flag = ''
+		if ratio > 1 + tolerance:
+			flag = '  REGRESSION'
+			regressions.append(key)
+		print('{:<8} {:<16} {:>12.6g} -> {:>12.6g} {}  x{:.2f}{}'.format(key[0], key[1],
+			previous['best'], result['best'], result['unit'], ratio, flag))
+	return regressions
+
+def main():
+	parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--cases', nargs = '+', choices = sorted(CASES), default = ['small', 'romeo', 'large'])
+	parser.add_argument('--repeat', type = int, default = 10, help = 'Runs per measurement; the large case uses a fifth')
+	parser.add_argument('--large-links', type = int, default = 10000, help = 'Links in the generated large robot')
+	parser.add_argument('-o', '--output', default = None, help = 'Write the JSON report here (default: stdout)')
+	parser.add_argument('--baseline', default = None, help = 'JSON report to compare against')
+	parser.add_argument('--tolerance', type = float, default = 0.2, help = 'Allowed slowdown ratio before flagging a regression')
+	options = parser.parse_args()
+
+	report = run(options)
+	text = json.dumps(report, indent = 2, sort_keys = True)
+	if options.output is None:
+		print(text)
+	else:
+		with open(options.output, 'w') as f:
+			f.write(text + '\n')
+	if options.baseline is not None:
+		with open(options.baseline) as f:
+			baseline = json.load(f)
+		regressions = compare(report, baseline, options.tolerance)
+		if regressions:
+			sys.exit(1)
+
+if __name__ == '__main__':
+	main()
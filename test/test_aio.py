@@ -0,0 +1,58 @@
+from __future__ import print_function
+
+import os
+import sys
+import unittest
+from urdf_parser_py import urdf
+
+ROMEO = os.path.join(os.path.dirname(__file__), 'romeo', 'romeo.urdf')
+XML = '<robot name="robot{}"><link name="a"/></robot>'
+
+
+def run(coroutine):
+    import asyncio
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+@unittest.skipIf(sys.version_info < (3, 5), 'asyncio loaders need Python 3.5')
+class TestAsyncLoader(unittest.TestCase):
+    def setUp(self):
+        from urdf_parser_py import aio
+        self.aio = aio
+
+    def test_overlap(self):
+        source = self.aio.MemorySource(dict((i, XML.format(i)) for i in range(20)), delay=0.05)
+        robots = run(self.aio.Loader(source, limit=20).load_many(range(20)))
+        self.assertEqual([robot.name for robot in robots], ['robot{}'.format(i) for i in range(20)])
+        # All fetches were in progress at once
+        self.assertEqual(source.max_active, 20)
+
+    def test_limit(self):
+        source = self.aio.MemorySource(dict((i, XML.format(i)) for i in range(6)), delay=0.01)
+        loader = self.aio.Loader(source, limit=2, compact=True)
+        robots = run(loader.load_many(range(6)))
+        self.assertEqual(source.max_active, 2)
+        self.assertEqual(type(robots[0].links[0]).__name__, 'CompactLink')
+        # Reusable from another loop
+        self.assertEqual(run(loader.load(0)).name, 'robot0')
+
+    def test_errors(self):
+        source = self.aio.MemorySource({0: XML.format(0), 1: '<robot'})
+        results = run(self.aio.Loader(source).load_many([0, 1, 2], return_exceptions=True))
+        self.assertEqual(results[0].name, 'robot0')
+        self.assertIsInstance(results[1], Exception)
+        self.assertIsInstance(results[2], KeyError)
+
+    def test_file(self):
+        robot = run(urdf.Robot.from_xml_file_async(ROMEO))
+        self.assertEqual(robot.to_xml_string(), urdf.Robot.from_xml_file(ROMEO).to_xml_string())
+        robots = run(self.aio.load_files([ROMEO, ROMEO], limit=1))
+        self.assertEqual([robot.name for robot in robots], [robot.name] * 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
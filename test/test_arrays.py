@@ -0,0 +1,56 @@
+from __future__ import print_function
+
+import os
+import unittest
+import numpy
+from lxml import etree
+from urdf_parser_py import urdf
+
+ROMEO = os.path.join(os.path.dirname(__file__), 'romeo', 'romeo.urdf')
+
+
+class TestRobotArrays(unittest.TestCase):
+    def setUp(self):
+        with open(ROMEO) as f:
+            self.robot = urdf.Robot.from_xml_string(f.read())
+
+    def test_export(self):
+        arrays = self.robot.to_arrays()
+        self.assertIs(self.robot.to_arrays(), arrays)
+        joint = self.robot.joint_map['LElbowYaw']
+        i = arrays.joint_index['LElbowYaw']
+        self.assertEqual(urdf.Joint.TYPES[arrays.joint_type[i]], joint.type)
+        self.assertEqual(arrays.link_names[arrays.joint_child[i]], joint.child)
+        self.assertEqual(arrays.joint_upper[i], joint.limit.upper)
+        numpy.testing.assert_array_equal(arrays.joint_axis[i], joint.axis)
+        link = self.robot.link_map['torso']
+        j = arrays.link_index['torso']
+        self.assertEqual(arrays.link_mass[j], link.inertial.mass)
+        numpy.testing.assert_array_equal(arrays.link_inertia[j], link.inertial.inertia.to_matrix())
+        self.assertEqual(arrays.link_names[arrays.link_parent[j]], self.robot.parent_map['torso'][1])
+        root = arrays.link_index[self.robot.get_root()]
+        self.assertEqual(arrays.link_parent[root], -1)
+
+    def test_round_trip(self):
+        before = etree.tostring(self.robot.to_xml())
+        arrays = self.robot.to_arrays()
+        arrays.apply(self.robot)
+        self.assertEqual(etree.tostring(self.robot.to_xml()), before)
+
+        i = arrays.joint_index['LElbowYaw']
+        arrays.joint_upper[i] = 0.5
+        arrays.joint_origin_xyz[i] = [1, 2, 3]
+        j = arrays.link_index['torso']
+        arrays.link_mass[j] = 2.
+        arrays.link_inertia[j] = numpy.nan
+        arrays.apply(self.robot)
+        joint = self.robot.joint_map['LElbowYaw']
+        self.assertEqual(joint.limit.upper, 0.5)
+        self.assertEqual(joint.origin.xyz, [1, 2, 3])
+        self.assertEqual(self.robot.link_map['torso'].inertial.mass, 2.)
+        self.assertIsNone(self.robot.link_map['torso'].inertial.inertia)
+        self.assertIs(self.robot.to_arrays(), arrays)
+
+
+if __name__ == '__main__':
+    unittest.main()
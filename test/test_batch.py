@@ -0,0 +1,58 @@
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+from urdf_parser_py import batch
+
+ROMEO = os.path.join(os.path.dirname(__file__), 'romeo', 'romeo.urdf')
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        shutil.copy(ROMEO, os.path.join(self.directory, 'romeo.urdf'))
+        os.mkdir(os.path.join(self.directory, 'sub'))
+        with open(os.path.join(self.directory, 'sub', 'warn.urdf'), 'w') as f:
+            f.write('<robot name="warn"><link name="a"/><sensor/></robot>')
+        with open(os.path.join(self.directory, 'sub', 'broken.urdf'), 'w') as f:
+            f.write('<robot name="broken"><joint name="j" type="fixed"/></robot>')
+        with open(os.path.join(self.directory, 'notes.txt'), 'w') as f:
+            f.write('ignored')
+        with open(os.path.join(self.directory, 'sub', 'package.xml'), 'w') as f:
+            f.write('<package><name>ignored</name></package>')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def check(self, results):
+        results = dict((os.path.basename(result.path), result) for result in results)
+        self.assertEqual(sorted(results), ['broken.urdf', 'romeo.urdf', 'warn.urdf'])
+        romeo = results['romeo.urdf']
+        self.assertTrue(romeo.ok)
+        self.assertEqual(romeo.summary['root'], 'base_link')
+        self.assertEqual(romeo.summary['links'], 68)
+        self.assertEqual(results['warn.urdf'].diagnostics, ['Unknown tag: sensor'])
+        self.assertFalse(results['broken.urdf'].ok)
+        self.assertIn('Required element not set in XML', results['broken.urdf'].error)
+        return results
+
+    def test_in_process(self):
+        self.check(batch.parse_directory(self.directory, jobs=1))
+
+    def test_extensions(self):
+        paths = batch.find_files(self.directory, ('.urdf', '.xml'))
+        self.assertIn(os.path.join(self.directory, 'sub', 'package.xml'), paths)
+        results = list(batch.parse_directory(self.directory, jobs=1, extensions=['.xml']))
+        self.assertEqual([os.path.basename(result.path) for result in results], ['package.xml'])
+
+    def test_pool(self):
+        results = self.check(batch.parse_directory(self.directory, jobs=2, full=True))
+        robot = results['romeo.urdf'].robot
+        self.assertEqual(robot.get_root(), 'base_link')
+        self.assertIsNone(results['broken.urdf'].robot)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+from __future__ import print_function
+
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+from lxml import etree
+from urdf_parser_py import cache
+
+ROMEO = os.path.join(os.path.dirname(__file__), 'romeo', 'romeo.urdf')
+
+
+class TestSnapshotCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        with open(ROMEO, 'rb') as f:
+            self.xml = f.read()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_hit(self):
+        snapshots = cache.SnapshotCache(self.directory)
+        self.assertIsNone(snapshots.load(self.xml))
+        robot = snapshots.from_xml_string(self.xml)
+        cached = snapshots.load(self.xml)
+        self.assertIsNotNone(cached)
+        self.assertIsNot(cached, robot)
+        self.assertEqual(etree.tostring(cached.to_xml()), etree.tostring(robot.to_xml()))
+        self.assertEqual(cached.parent_map, robot.parent_map)
+        self.assertEqual(cached.child_map, robot.child_map)
+        self.assertEqual(cached.get_root(), robot.get_root())
+        # Object identity is kept within the snapshot
+        self.assertIs(cached.link_map['body'], cached.links[1])
+        self.assertEqual([cached.aggregate_type[obj] for obj in cached.aggregate_order],
+                         [robot.aggregate_type[obj] for obj in robot.aggregate_order])
+
+    def test_raw_elements(self):
+        xml = b'<robot name="r"><link name="a"/><gazebo reference="a"><mu1>0.2</mu1></gazebo></robot>'
+        snapshots = cache.SnapshotCache(self.directory)
+        snapshots.from_xml_string(xml)
+        cached = snapshots.load(xml)
+        self.assertEqual(cached.gazebos[0].find('mu1').text, '0.2')
+
+    def test_stale(self):
+        snapshots = cache.SnapshotCache(self.directory)
+        snapshots.from_xml_string(self.xml)
+        path = snapshots.get_path(self.xml)
+        # Corrupt entry
+        with open(path, 'r+b') as f:
+            f.seek(len(cache.MAGIC) + 10)
+            f.write(b'garbage')
+        self.assertIsNone(snapshots.load(self.xml))
+        # Different schema / version
+        snapshots.from_xml_string(self.xml)
+        other = cache.SnapshotCache(self.directory)
+        other.header += b';other'
+        self.assertIsNone(other.load(self.xml))
+
+    def test_unloadable(self):
+        snapshots = cache.SnapshotCache(self.directory)
+        path = snapshots.get_path(self.xml)
+        # Newer pickle protocol, missing class
+        for payload in [b'\x80\x7f', b'cmissing_module\nMissing\n.']:
+            with open(path, 'wb') as f:
+                f.write(cache.MAGIC)
+                f.write(struct.pack('>I', len(snapshots.header)))
+                f.write(snapshots.header)
+                f.write(payload)
+            self.assertIsNone(snapshots.load(self.xml))
+            self.assertIsNotNone(snapshots.from_xml_string(self.xml))
+
+    def test_eviction(self):
+        snapshots = cache.SnapshotCache(self.directory)
+        snapshots.from_xml_string(self.xml)
+        (entry,) = snapshots.entries()
+        snapshots.max_size = int(entry[1] * 1.5)
+        xml = b'<robot name="r"><link name="a"/></robot>'
+        snapshots.from_xml_string(xml)
+        self.assertEqual(len(snapshots.entries()), 2)
+        os.utime(snapshots.get_path(xml), (0, 0))
+        other_xml = self.xml.replace(b'romeo', b'romeo2')
+        snapshots.from_xml_string(other_xml)
+        paths = [path for (mtime, size, path) in snapshots.entries()]
+        self.assertNotIn(snapshots.get_path(xml), paths)
+        self.assertIn(snapshots.get_path(other_xml), paths)
+        self.assertLessEqual(sum(size for (mtime, size, path) in snapshots.entries()),
+                             snapshots.max_size)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+import numpy
+from urdf_parser_py import urdf
+from urdf_parser_py import compiled
+
+ROMEO = os.path.join(os.path.dirname(__file__), 'romeo', 'romeo.urdf')
+
+
+class TestCompiledRobot(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        with open(ROMEO) as f:
+            self.robot = urdf.Robot.from_xml_string(f.read())
+        self.path = os.path.join(self.directory, 'romeo.model')
+        compiled.dump(self.robot, self.path)
+        self.model = compiled.load(self.path)
+
+    def tearDown(self):
+        del self.model
+        shutil.rmtree(self.directory)
+
+    def test_names(self):
+        self.assertEqual(self.model.name, self.robot.name)
+        self.assertEqual(list(self.model.link_map), [link.name for link in self.robot.links])
+        self.assertEqual(list(self.model.joint_map), [joint.name for joint in self.robot.joints])
+        self.assertIn('torso', self.model.link_map)
+        self.assertNotIn('missing', self.model.link_map)
+        self.assertRaises(KeyError, lambda: self.model.joint_map['missing'])
+
+    def test_values(self):
+        joint = self.model.joint_map['LElbowYaw']
+        expected = self.robot.joint_map['LElbowYaw']
+        self.assertEqual(joint.type, expected.type)
+        self.assertEqual((joint.parent, joint.child), (expected.parent, expected.child))
+        numpy.testing.assert_array_equal(joint.axis, expected.axis)
+        numpy.testing.assert_array_equal(joint.origin.xyz, expected.origin.xyz)
+        self.assertEqual(joint.limit.upper, expected.limit.upper)
+        self.assertIsNone(joint.mimic)
+        inertial = self.model.link_map['torso'].inertial
+        self.assertEqual(inertial.mass, self.robot.link_map['torso'].inertial.mass)
+        # Arrays view the read-only mapping
+        self.assertRaises(ValueError, joint.axis.__setitem__, 0, 1.)
+
+    def test_topology(self):
+        self.assertEqual(self.model.get_root(), self.robot.get_root())
+        for (root, tip) in [('base_link', 'LFinger13Link'), ('LFinger13Link', 'RFinger13Link'), ('torso', 'torso')]:
+            for options in [{}, {'links': False}, {'joints': False}, {'fixed': False}]:
+                self.assertEqual(self.model.get_chain(root, tip, **options), self.robot.get_chain(root, tip, **options))
+
+    def test_disconnected(self):
+        robot = urdf.Robot.from_xml_string('''<robot name="r">
+  <link name="a"/><link name="b"/><link name="c"/>
+  <joint name="j" type="fixed"><parent link="a"/><child link="b"/></joint>
+</robot>''')
+        model = compiled.loads(compiled.dumps(robot))
+        self.assertRaises(Exception, robot.get_chain, 'b', 'c')
+        with self.assertRaises(Exception) as cm:
+            model.get_chain('b', 'c')
+        self.assertEqual(str(cm.exception), 'No path between links: b, c')
+        self.assertEqual(model.get_chain('b', 'a'), robot.get_chain('b', 'a'))
+
+    def test_buffer(self):
+        model = compiled.loads(compiled.dumps(self.robot))
+        self.assertEqual(model.get_chain('base_link', 'LFinger13Link'), self.model.get_chain('base_link', 'LFinger13Link'))
+        self.assertRaises(Exception, compiled.loads, b'not a model')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+from __future__ import print_function
+
+import unittest
+from urdf_parser_py import urdf
+
+XML = '''<robot name="test">
+  <link name="a"/>
+  <link name="b"/>
+  <link name="c"/>
+  <joint name="j1" type="revolute">
+    <parent link="a"/>
+    <child link="b"/>
+    <limit effort="1" velocity="1" lower="-1" upper="1"/>
+  </joint>
+  <joint name="j2" type="fixed">
+    <parent link="b"/>
+    <child link="c"/>
+  </joint>
+  <material name="red"><color rgba="1 0 0 1"/></material>
+</robot>'''
+
+
+class TestIncrementalUpdate(unittest.TestCase):
+    def setUp(self):
+        self.robot = urdf.Robot.from_xml_string(XML)
+
+    def check_same(self, xml):
+        expected = urdf.Robot.from_xml_string(xml)
+        self.assertEqual(self.robot.to_xml_string(), expected.to_xml_string())
+        self.assertEqual(self.robot.parent_map, expected.parent_map)
+        self.assertEqual(self.robot.child_map, expected.child_map)
+        self.assertEqual(sorted(self.robot.link_map), sorted(expected.link_map))
+        self.assertEqual(sorted(self.robot.joint_map), sorted(expected.joint_map))
+        for link in self.robot.links:
+            self.assertIs(self.robot.link_map[link.name], link)
+        for joint in self.robot.joints:
+            self.assertIs(self.robot.joint_map[joint.name], joint)
+        self.assertEqual([self.robot.aggregate_type[obj] for obj in self.robot.aggregate_order],
+                         [expected.aggregate_type[obj] for obj in expected.aggregate_order])
+
+    def test_changed(self):
+        xml = XML.replace('upper="1"', 'upper="2"')
+        unchanged = self.robot.joint_map['j2']
+        links = self.robot.links
+        revision = self.robot.topology_revision
+        report = self.robot.update_from_xml_string(XML, xml)
+        self.assertEqual(report.changed, [('joint', 'j1')])
+        self.assertEqual((report.added, report.removed), ([], []))
+        self.assertTrue(report.topology_changed)
+        self.assertGreater(self.robot.topology_revision, revision)
+        self.assertEqual(self.robot.joint_map['j1'].limit.upper, 2)
+        self.assertIs(self.robot.joint_map['j2'], unchanged)
+        self.assertIs(self.robot.links, links)
+        self.check_same(xml)
+
+    def test_added_removed(self):
+        xml = XML.replace('  <link name="c"/>\n', '').replace('<child link="c"/>', '<child link="d"/>')
+        xml = xml.replace('</robot>', '  <link name="d"/>\n</robot>')
+        report = self.robot.update_from_xml_string(XML, xml)
+        self.assertEqual(report.added, [('link', 'd')])
+        self.assertEqual(report.removed, [('link', 'c')])
+        self.assertEqual(report.changed, [('joint', 'j2')])
+        self.check_same(xml)
+        self.assertEqual(self.robot.get_chain('a', 'd', links = False), ['j1', 'j2'])
+        # Chained updates, back to the original
+        report = self.robot.update_from_xml_string(xml, XML)
+        self.assertEqual(report.removed, [('link', 'd')])
+        self.check_same(XML)
+
+    def test_unchanged(self):
+        xml = XML.replace('rgba="1 0 0 1"', 'rgba="0 1 0 1"').replace('name="test"', 'name="other"')
+        revision = self.robot.topology_revision
+        report = self.robot.update_from_xml_string(XML, xml)
+        self.assertEqual(report.changed, [('material', 'red')])
+        self.assertTrue(report.attributes_changed)
+        self.assertFalse(report.topology_changed)
+        self.assertEqual(self.robot.topology_revision, revision)
+        self.assertEqual(self.robot.name, 'other')
+        self.check_same(xml)
+        self.assertFalse(self.robot.update_from_xml_string(xml, xml))
+
+    def test_attributes(self):
+        xml = XML.replace('<robot name="test">', '<robot extra="1">')
+        xml = xml.replace('</robot>', '  <widget/>\n</robot>')
+        errors = []
+        report = self.robot.update_from_xml_string(XML, xml, on_error=errors.append)
+        self.assertIsNone(self.robot.name)
+        self.assertIn('attributes_changed=True', repr(report))
+        self.assertEqual(errors, ['Unknown attribute: extra', 'Unknown tag: widget'])
+        expected = []
+        urdf.Robot.from_xml_string(xml, on_error=expected.append)
+        self.assertEqual(errors, expected)
+        self.check_same(xml)
+
+    def test_mismatch(self):
+        self.robot.add_link(urdf.Link('extra'))
+        self.assertRaises(Exception, self.robot.update_from_xml_string, XML, XML)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,201 @@
+from __future__ import print_function
+
+import os
+import unittest
+import numpy
+from urdf_parser_py import urdf
+from urdf_parser_py import kinematics
+
+ROMEO = os.path.join(os.path.dirname(__file__), 'romeo', 'romeo.urdf')
+
+ARM = '''<?xml version="1.0"?>
+<robot name="arm">
+  <link name="base"/>
+  <link name="upper"/>
+  <link name="slider"/>
+  <link name="finger"/>
+  <link name="tool"/>
+  <joint name="shoulder" type="revolute">
+    <parent link="base"/>
+    <child link="upper"/>
+    <origin xyz="0 0 1"/>
+    <axis xyz="0 0 1"/>
+    <limit effort="1" velocity="1" lower="-3" upper="3"/>
+  </joint>
+  <joint name="extend" type="prismatic">
+    <parent link="upper"/>
+    <child link="slider"/>
+    <origin xyz="1 0 0"/>
+    <axis xyz="1 0 0"/>
+    <limit effort="1" velocity="1" lower="0" upper="1"/>
+  </joint>
+  <joint name="finger_joint" type="revolute">
+    <parent link="slider"/>
+    <child link="finger"/>
+    <axis xyz="0 1 0"/>
+    <mimic joint="shoulder" multiplier="2" offset="0.5"/>
+    <limit effort="1" velocity="1"/>
+  </joint>
+  <joint name="tool_joint" type="fixed">
+    <parent link="finger"/>
+    <child link="tool"/>
+    <origin xyz="0 0 0.5" rpy="0 0 1.5707963267948966"/>
+  </joint>
+</robot>'''
+
+SIBLINGS = '''<robot name="siblings">
+  <link name="base"/>
+  <link name="a"/>
+  <link name="b"/>
+  <joint name="a_joint" type="revolute">
+    <parent link="base"/>
+    <child link="a"/>
+    <origin xyz="1 0 0"/>
+    <axis xyz="0 0 1"/>
+    <limit effort="1" velocity="1"/>
+  </joint>
+  <joint name="b_joint" type="fixed">
+    <parent link="base"/>
+    <child link="b"/>
+    <origin xyz="0 1 0"/>
+  </joint>
+</robot>'''
+
+
+def reference_transform(tree, robot, q, link):
+    """ Naive per-joint product along get_chain() """
+    values = dict(zip(tree.joint_names, tree.joint_values(q)))
+    transform = numpy.eye(4)
+    for name in robot.get_chain(robot.get_root(), link, links=False):
+        joint = robot.joint_map[name]
+        axis = kinematics.joint_axis(joint)
+        motion = numpy.eye(4)
+        if joint.type in ['revolute', 'continuous']:
+            motion[:3, :3] = rotation(axis, values[name])
+        elif joint.type == 'prismatic':
+            motion[:3, 3] = axis * values[name]
+        transform = transform.dot(kinematics.pose_to_matrix(joint.origin)).dot(motion)
+    return transform
+
+
+def rotation(axis, angle):
+    k = kinematics.skew(axis)
+    return numpy.eye(3) + numpy.sin(angle) * k + (1 - numpy.cos(angle)) * k.dot(k)
+
+
+class TestKinematicTree(unittest.TestCase):
+    def setUp(self):
+        self.robot = urdf.Robot.from_xml_string(ARM)
+        self.tree = kinematics.KinematicTree(self.robot)
+
+    def test_structure(self):
+        self.assertEqual(self.tree.dof_names, ['shoulder', 'extend'])
+        self.assertEqual(self.tree.link_names, ['base', 'upper', 'slider', 'finger', 'tool'])
+
+    def test_link_transforms(self):
+        q = self.tree.positions({'shoulder': numpy.pi / 2, 'extend': 0.25})
+        transforms = self.tree.link_transforms(q)
+        numpy.testing.assert_allclose(transforms[self.tree.link_index['slider']][:3, 3],
+                                      [0, 1.25, 1], atol=1e-12)
+        # Mimic: finger angle is 2 * pi / 2 + 0.5
+        values = self.tree.joint_values(q)
+        self.assertAlmostEqual(values[self.tree.joint_index['finger_joint']], numpy.pi + 0.5)
+        for link in self.tree.link_names:
+            numpy.testing.assert_allclose(self.tree.link_transform(q, link),
+                                          reference_transform(self.tree, self.robot, q, link),
+                                          atol=1e-12)
+
+    def test_romeo(self):
+        with open(ROMEO) as f:
+            robot = urdf.Robot.from_xml_string(f.read())
+        tree = kinematics.KinematicTree(robot)
+        q = numpy.random.RandomState(0).uniform(-1, 1, tree.dof)
+        transforms = tree.link_transforms(q)
+        for link in tree.link_names:
+            numpy.testing.assert_allclose(transforms[tree.link_index[link]],
+                                          reference_transform(tree, robot, q, link),
+                                          atol=1e-12)
+
+    def test_batch(self):
+        q = numpy.random.RandomState(1).uniform(-1, 1, (7, self.tree.dof))
+        transforms = self.tree.batch_link_transforms(q)
+        self.assertEqual(transforms.shape, (7, len(self.tree.link_names), 4, 4))
+        for i in range(len(q)):
+            numpy.testing.assert_allclose(transforms[i], self.tree.link_transforms(q[i]))
+        links = ['tool', 'upper']
+        out = numpy.zeros((7, 2, 4, 4))
+        result = self.tree.batch_link_transforms(q, links, chunk_size=3, out=out)
+        self.assertIs(result, out)
+        numpy.testing.assert_allclose(out, transforms[:, [4, 1]])
+
+
+class TestKinematicChain(unittest.TestCase):
+    def setUp(self):
+        with open(ROMEO) as f:
+            self.robot = urdf.Robot.from_xml_string(f.read())
+        self.root = self.robot.get_root()
+        self.tip = 'LWristYawLink'
+
+    def test_transform(self):
+        chain = kinematics.KinematicChain(self.robot, self.root, self.tip)
+        tree = kinematics.KinematicTree(self.robot)
+        self.assertEqual(chain.joint_names,
+                         self.robot.get_chain(self.root, self.tip, links=False, fixed=False))
+        q = numpy.random.RandomState(2).uniform(-1, 1, chain.dof)
+        numpy.testing.assert_allclose(chain.transform(q),
+                                      tree.link_transform(tree.positions(dict(zip(chain.joint_names, q))), self.tip),
+                                      atol=1e-12)
+
+    def test_jacobian(self):
+        chain = kinematics.KinematicChain(self.robot, self.root, self.tip)
+        q = numpy.random.RandomState(3).uniform(-1, 1, (4, chain.dof))
+        jacobians = chain.batch_jacobian(q, chunk_size=3)
+        self.assertEqual(jacobians.shape, (4, 6, chain.dof))
+        for (qi, jacobian) in zip(q, jacobians):
+            numpy.testing.assert_allclose(chain.jacobian(qi), jacobian)
+            self.check_jacobian(chain, qi)
+
+    def check_jacobian(self, chain, q):
+        """ Central differences of position and orientation """
+        eps = 1e-6
+        jacobian = chain.jacobian(q)
+        transform = chain.transform(q)
+        for k in range(chain.dof):
+            dq = numpy.zeros(chain.dof)
+            dq[k] = eps
+            plus = chain.transform(q + dq)
+            minus = chain.transform(q - dq)
+            numpy.testing.assert_allclose((plus[:3, 3] - minus[:3, 3]) / (2 * eps),
+                                          jacobian[:3, k], atol=1e-6)
+            omega = (plus[:3, :3] - minus[:3, :3]).dot(transform[:3, :3].T) / (2 * eps)
+            numpy.testing.assert_allclose([omega[2, 1], omega[0, 2], omega[1, 0]],
+                                          jacobian[3:, k], atol=1e-6)
+
+    def test_siblings(self):
+        robot = urdf.Robot.from_xml_string(SIBLINGS)
+        chain = kinematics.KinematicChain(robot, 'a', 'b')
+        numpy.testing.assert_allclose(chain.transform([0.])[:3, 3], [-1, 1, 0], atol=1e-12)
+        numpy.testing.assert_allclose(chain.transform([numpy.pi / 2])[:3, 3], [1, 1, 0], atol=1e-12)
+        # Between the wrists of romeo, through the torso
+        tip = 'RWristYawLink'
+        chain = kinematics.KinematicChain(self.robot, self.tip, tip)
+        tree = kinematics.KinematicTree(self.robot)
+        q = numpy.random.RandomState(4).uniform(-1, 1, chain.dof)
+        positions = tree.positions(dict(zip(chain.joint_names, q)))
+        expected = numpy.linalg.inv(tree.link_transform(positions, self.tip)).dot(tree.link_transform(positions, tip))
+        numpy.testing.assert_allclose(chain.transform(q), expected, atol=1e-12)
+        self.check_jacobian(chain, q)
+
+    def test_cache(self):
+        chain = kinematics.get_kinematic_chain(self.robot, self.root, self.tip)
+        self.assertIs(kinematics.get_kinematic_chain(self.robot, self.root, self.tip), chain)
+        tree = kinematics.get_kinematic_tree(self.robot)
+        self.assertIs(kinematics.get_kinematic_tree(self.robot), tree)
+        self.robot.add_link(urdf.Link('extra'))
+        self.robot.add_joint(urdf.Joint('extra_joint', self.tip, 'extra', 'fixed'))
+        self.assertIsNot(kinematics.get_kinematic_chain(self.robot, self.root, self.tip), chain)
+        self.assertIn('extra', kinematics.get_kinematic_tree(self.robot).link_index)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+from __future__ import print_function
+
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import unittest
+import mock
+from urdf_parser_py import urdf
+from urdf_parser_py import sources
+
+XML = '<robot name="{}"><link name="a"/></robot>'
+
+
+class CountingSource(sources.FileSource):
+    def __init__(self):
+        self.fetches = 0
+
+    def fetch(self, path):
+        self.fetches += 1
+        return sources.FileSource.fetch(self, path)
+
+
+class TestCachedLoader(unittest.TestCase):
+    def test_memoize(self):
+        source = sources.MemorySource({'robot': XML.format('one')})
+        loader = sources.CachedLoader(source)
+        robot = loader.load('robot')
+        self.assertIs(loader.load('robot'), robot)
+        # Same content in a new string
+        source.descriptions['robot'] = ''.join(XML.format('one'))
+        self.assertEqual(loader.poll('robot'), (robot, False))
+        source.descriptions['robot'] = XML.format('two')
+        (changed, parsed) = loader.poll('robot')
+        self.assertTrue(parsed)
+        self.assertEqual(changed.name, 'two')
+        loader.invalidate('robot')
+        self.assertIsNot(loader.load('robot'), changed)
+
+    def test_file_version(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'robot.urdf')
+            with open(path, 'w') as f:
+                f.write(XML.format('one'))
+            source = CountingSource()
+            loader = sources.CachedLoader(source, compact=True)
+            robot = loader.load(path)
+            self.assertEqual(type(robot.links[0]).__name__, 'CompactLink')
+            self.assertIs(loader.load(path), robot)
+            # Not read again while unchanged
+            self.assertEqual(source.fetches, 1)
+            with open(path, 'w') as f:
+                f.write(XML.format('other'))
+            os.utime(path, (0, 12345))
+            self.assertEqual(loader.load(path).name, 'other')
+        finally:
+            shutil.rmtree(directory)
+
+    def test_watch(self):
+        source = sources.MemorySource({'robot': XML.format('one')})
+        loaded = []
+        changed = threading.Event()
+        def callback(robot):
+            loaded.append(robot.name)
+            changed.set()
+        watcher = sources.CachedLoader(source).watch('robot', callback, interval=0.01)
+        try:
+            self.assertTrue(changed.wait(5))
+            changed.clear()
+            source.descriptions['robot'] = XML.format('two')
+            self.assertTrue(changed.wait(5))
+        finally:
+            watcher.stop()
+        self.assertEqual(loaded, ['one', 'two'])
+        self.assertIsNone(watcher.error)
+
+    def test_parameter_server(self):
+        rospy = mock.Mock(spec=['get_param'])
+        rospy.get_param.return_value = XML.format('param')
+        with mock.patch.dict(sys.modules, {'rospy': rospy}):
+            sources.parameter_loaders.clear()
+            try:
+                robot = urdf.Robot.from_parameter_server(cached=True)
+                self.assertIs(urdf.Robot.from_parameter_server(cached=True), robot)
+                self.assertIsNot(urdf.Robot.from_parameter_server(), robot)
+            finally:
+                sources.parameter_loaders.clear()
+        self.assertEqual(robot.name, 'param')
+        rospy.get_param.assert_called_with('robot_description')
+
+
+if __name__ == '__main__':
+    unittest.main()
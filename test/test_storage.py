@@ -0,0 +1,87 @@
+from __future__ import print_function
+
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+import numpy
+from urdf_parser_py import urdf
+
+ROMEO = os.path.join(os.path.dirname(__file__), 'romeo', 'romeo.urdf')
+
+
+class TestFloatBuffer(unittest.TestCase):
+    def setUp(self):
+        with open(ROMEO) as f:
+            self.xml_string = f.read()
+        self.robot = urdf.Robot.from_xml_string(self.xml_string, pack_floats = True)
+        self.buffer = self.robot.float_buffer
+
+    def test_views(self):
+        joint = self.robot.joint_map['LElbowYaw']
+        array = self.buffer.array
+        self.assertEqual(array.size, self.buffer.size)
+        self.assertTrue(numpy.shares_memory(joint.origin.xyz, array))
+        self.assertTrue(numpy.shares_memory(joint.limit.upper, array))
+        (offset, size) = self.buffer.get_offset(joint.origin, 'xyz')
+        self.assertEqual(size, 3)
+        array[offset:offset + 3] = [1, 2, 3]
+        self.assertEqual(list(joint.origin.xyz), [1, 2, 3])
+        joint.limit.upper[()] = 0.25
+        self.assertIn('upper="0.25"', self.robot.to_xml_string())
+
+    def test_same_output(self):
+        robot = urdf.Robot.from_xml_string(self.xml_string)
+        self.assertEqual(self.robot.to_xml_string(), robot.to_xml_string())
+
+    def test_bind(self):
+        array = self.buffer.array * 2
+        self.buffer.bind(array)
+        joint = self.robot.joint_map['LElbowYaw']
+        self.assertTrue(numpy.shares_memory(joint.origin.xyz, array))
+        self.assertRaises(Exception, self.buffer.bind, numpy.zeros(self.buffer.size + 1))
+
+    def test_save_load(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'floats.npy')
+            self.buffer.save(path)
+            self.buffer.load(path)
+            self.assertIsInstance(self.buffer.array, numpy.memmap)
+            inertial = self.robot.link_map['torso'].inertial
+            (offset, size) = self.buffer.get_offset(inertial, 'mass')
+            inertial.mass[()] = 42
+            self.buffer.array.flush()
+            self.assertEqual(numpy.load(path)[offset], 42)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_pickle(self):
+        robot = pickle.loads(pickle.dumps(self.robot, 2))
+        joint = robot.joint_map['LElbowYaw']
+        self.assertTrue(numpy.shares_memory(joint.origin.xyz, robot.float_buffer.array))
+        self.assertEqual(robot.to_xml_string(), self.robot.to_xml_string())
+
+    def test_interned(self):
+        table = {}
+        first = urdf.Robot.from_xml_string(self.xml_string, intern = table, pack_floats = True)
+        second = urdf.Robot.from_xml_string(self.xml_string, intern = table, pack_floats = True)
+        for robot in [first, second]:
+            joint = robot.joint_map['LElbowYaw']
+            self.assertTrue(numpy.shares_memory(joint.origin.xyz, robot.float_buffer.array))
+        self.assertFalse(numpy.shares_memory(first.joint_map['LElbowYaw'].origin.xyz, second.float_buffer.array))
+        self.assertEqual(first.to_xml_string(), self.robot.to_xml_string())
+        # The interned objects themselves are left alone
+        origin = urdf.Robot.from_xml_string(self.xml_string, intern = table).joint_map['LElbowYaw'].origin
+        self.assertIsInstance(origin.xyz, tuple)
+
+    def test_compact(self):
+        link = urdf.Link.from_xml_string(b'<link name="a"><inertial><mass value="2"/></inertial></link>',
+                                         compact = True, pack_floats = True)
+        self.assertFalse(hasattr(link, 'float_buffer'))
+        self.assertEqual(link.inertial.mass.base.tolist(), [2.])
+
+
+if __name__ == '__main__':
+    unittest.main()
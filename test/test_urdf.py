@@ -1,10 +1,15 @@
 from __future__ import print_function
 
+import io
+import sys
+import threading
 import unittest
 import mock
+from lxml import etree
 from xml.dom import minidom
 from xml_matching import xml_matches
 from urdf_parser_py import urdf
+import urdf_parser_py.xml_reflection as xmlr
 
 class ParseException(Exception):
     pass
@@ -134,5 +139,439 @@ class TestURDFParser(unittest.TestCase):
         self.assertRaises(ParseException, self.parse, xml)
 
 
+class TestURDFStream(unittest.TestCase):
+    xml = b'''<?xml version="1.0"?>
+<robot name="test">
+  <link name="a"/>
+  <!-- comment -->
+  <joint name="j" type="revolute">
+    <parent link="a"/>
+    <child link="b"/>
+    <limit effort="1" velocity="1"/>
+  </joint>
+  <gazebo reference="a"><material>Gazebo/Grey</material></gazebo>
+  <link name="b"/>
+</robot>'''
+
+    def test_from_xml_stream(self):
+        robot = urdf.Robot.from_xml_stream(io.BytesIO(self.xml))
+        expected = urdf.Robot.from_xml_string(self.xml)
+        self.assertEqual(robot.name, 'test')
+        self.assertEqual(sorted(robot.link_map), ['a', 'b'])
+        self.assertEqual(robot.parent_map, expected.parent_map)
+        self.assertEqual(robot.gazebos[0].find('material').text, 'Gazebo/Grey')
+        self.assertEqual(etree.tostring(robot.to_xml()),
+                         etree.tostring(expected.to_xml()))
+
+    def test_iter_xml_stream(self):
+        robot = urdf.Robot()
+        values = list(robot.iter_xml_stream(io.BytesIO(self.xml)))
+        self.assertEqual(values, robot.aggregate_order)
+        self.assertEqual([type(value) for value in values],
+                         [urdf.Link, urdf.Joint, type(values[2]), urdf.Link])
+
+
+class TestURDFCompact(unittest.TestCase):
+    xml = TestURDFStream.xml.replace(b'<link name="b"/>', b'''<link name="b">
+    <visual>
+      <origin xyz="0 0 1"/>
+      <geometry><box size="1 2 3"/></geometry>
+    </visual>
+  </link>''')
+
+    def test_compact(self):
+        robot = urdf.Robot.from_xml_string(self.xml, compact=True)
+        expected = urdf.Robot.from_xml_string(self.xml)
+        self.assertEqual(type(robot), urdf.Robot)
+        link = robot.link_map['b']
+        self.assertFalse(hasattr(link, '__dict__'))
+        self.assertEqual(type(link).XML_BASE, urdf.Link)
+        self.assertIsInstance(link, urdf.Link)
+        self.assertIsInstance(link.visual.geometry, urdf.Box)
+        self.assertTrue(issubclass(type(link), urdf.Link))
+        self.assertNotIsInstance(link, urdf.Joint)
+        self.assertNotIsInstance(urdf.Link('c'), type(link))
+        self.assertEqual(link.visual.geometry.size, (1.0, 2.0, 3.0))
+        self.assertEqual(link.visual.origin.position, (0.0, 0.0, 1.0))
+        self.assertEqual(robot.joints[0].joint_type, 'revolute')
+        self.assertEqual(etree.tostring(robot.to_xml()),
+                         etree.tostring(expected.to_xml()))
+        # Options only apply to the call they are given to
+        self.assertEqual(type(urdf.Link.from_xml_string(b'<link name="c"/>')), urdf.Link)
+
+    def test_compact_pickle(self):
+        from urdf_parser_py import cache
+        robot = urdf.Robot.from_xml_string(self.xml, compact=True)
+        copy = cache.loads(cache.dumps(robot))
+        self.assertEqual(type(copy.link_map['b']), type(robot.link_map['b']))
+        self.assertEqual(etree.tostring(copy.to_xml()),
+                         etree.tostring(robot.to_xml()))
+
+
+class TestURDFIntern(unittest.TestCase):
+    xml = b'''<robot name="test">
+  <link name="a">
+    <visual>
+      <origin xyz="0 0 0"/>
+      <geometry><box size="1 1 1"/></geometry>
+      <material name="grey"><color rgba="0.5 0.5 0.5 1"/></material>
+    </visual>
+  </link>
+  <link name="b">
+    <visual>
+      <origin xyz="0 0 0"/>
+      <geometry><box size="1 1 1"/></geometry>
+      <material name="grey"><color rgba="0.5 0.5 0.5 1"/></material>
+    </visual>
+    <collision>
+      <origin xyz="0 0 1"/>
+      <geometry><box size="1 1 1" bogus="1"/></geometry>
+    </collision>
+  </link>
+</robot>'''
+
+    @mock.patch('urdf_parser_py.xml_reflection.core.on_error')
+    def test_intern(self, on_error):
+        robot = urdf.Robot.from_xml_string(self.xml, intern=True)
+        (a, b) = (robot.link_map['a'], robot.link_map['b'])
+        self.assertIs(a.visual.origin, b.visual.origin)
+        self.assertIs(a.visual.geometry, b.visual.geometry)
+        self.assertIs(a.visual.material, b.visual.material)
+        self.assertIsNot(b.visual.origin, b.collision.origin)
+        self.assertIsInstance(b.visual.origin, urdf.Pose)
+        self.assertIsInstance(robot.links[0].visual.origin, urdf.Pose)
+        self.assertEqual(b.visual.origin.position, (0.0, 0.0, 0.0))
+        # Unknown attributes are still reported, on a regular object
+        self.assertIsNot(b.collision.geometry, b.visual.geometry)
+        self.assertEqual(type(b.collision.geometry), urdf.Box)
+        self.assertIs(b.collision.geometry.size, b.visual.geometry.size)
+        on_error.assert_called_once_with('Unknown attribute: bogus')
+        self.assertEqual(etree.tostring(robot.to_xml()),
+                         etree.tostring(urdf.Robot.from_xml_string(self.xml).to_xml()))
+
+    @mock.patch('urdf_parser_py.xml_reflection.core.on_error', mock.Mock())
+    def test_thaw(self):
+        robot = urdf.Robot.from_xml_string(self.xml, intern=True)
+        (a, b) = (robot.link_map['a'], robot.link_map['b'])
+        with self.assertRaises(Exception):
+            a.visual.origin.xyz = [1, 0, 0]
+        origin = a.visual.origin.thaw()
+        self.assertEqual(type(origin), urdf.Pose)
+        origin.xyz[0] = 1.
+        a.visual.origin = origin
+        self.assertEqual(a.visual.origin.xyz, [1., 0., 0.])
+        self.assertEqual(b.visual.origin.xyz, (0., 0., 0.))
+        self.assertIs(origin.thaw(), origin)
+
+    @mock.patch('urdf_parser_py.xml_reflection.core.on_error', mock.Mock())
+    def test_shared_table(self):
+        table = {}
+        first = urdf.Robot.from_xml_string(self.xml, intern=table)
+        second = urdf.Robot.from_xml_string(self.xml, intern=table)
+        self.assertIs(first.link_map['a'].visual.origin,
+                      second.link_map['b'].visual.origin)
+
+    @mock.patch('urdf_parser_py.xml_reflection.core.on_error', mock.Mock())
+    def test_shared_table_profile(self):
+        table = {}
+        projected = urdf.Robot.from_xml_string(self.xml, intern=table, profile={'visual/origin': []})
+        self.assertIsNone(projected.link_map['a'].visual.origin.xyz)
+        robot = urdf.Robot.from_xml_string(self.xml, intern=table)
+        self.assertEqual(robot.link_map['a'].visual.origin.xyz, (0., 0., 0.))
+        self.assertEqual(robot.link_map['b'].collision.origin.xyz, (0., 0., 1.))
+
+
+class TestURDFWriter(unittest.TestCase):
+    xml = TestURDFCompact.xml.replace(b'<link name="a"/>', b'''<link name="a&amp;&lt;&quot;">
+    <visual>
+      <geometry><mesh filename="a b.dae" scale="1 1 1"/></geometry>
+      <material name="red"><color rgba="1 0 0 1"/></material>
+    </visual>
+  </link>''').replace(b'<parent link="a"/>', b'<parent link="a&amp;&lt;&quot;"/>')
+
+    def lxml_string(self, robot):
+        text = etree.tostring(robot.to_xml(), pretty_print=True)
+        return '<?xml version="1.0"?>\n' + text.decode('ascii')
+
+    def test_to_xml_string(self):
+        robot = urdf.Robot.from_xml_string(self.xml)
+        expected = self.lxml_string(robot)
+        self.assertEqual(robot.to_xml_string(), expected)
+        # Raw elements are copied, not moved, when written
+        self.assertEqual(robot.to_xml_string(), expected)
+        self.assertIn('Gazebo/Grey', expected)
+        self.assertIn('name="a&amp;&lt;&quot;"', expected)
+
+    def test_str(self):
+        robot = urdf.Robot.from_xml_string(self.xml)
+        self.assertEqual(robot.to_yaml()['joints'][0]['parent'], 'a&<"')
+        self.assertIn('size:', str(robot))
+
+    def test_to_xml_file(self):
+        robot = urdf.Robot.from_xml_string(self.xml)
+        expected = robot.to_xml_string()
+        binary = io.BytesIO()
+        robot.to_xml_file(binary)
+        self.assertEqual(binary.getvalue().decode('ascii'), expected)
+        text = io.StringIO()
+        robot.to_xml_file(text)
+        self.assertEqual(text.getvalue(), expected)
+
+
+class TestURDFNumpyVectors(unittest.TestCase):
+    xml = TestURDFCompact.xml
+
+    def test_numpy_vectors(self):
+        import numpy
+        robot = urdf.Robot.from_xml_string(self.xml, numpy_vectors=True)
+        visual = robot.link_map['b'].visual
+        self.assertIsInstance(visual.geometry.size, numpy.ndarray)
+        self.assertEqual(visual.geometry.size.tolist(), [1.0, 2.0, 3.0])
+        self.assertEqual(robot.to_xml_string(), urdf.Robot.from_xml_string(self.xml).to_xml_string())
+
+    def test_interned(self):
+        robot = urdf.Robot.from_xml_string(self.xml.replace(b'xyz="0 0 1"', b'xyz="1 2 3"'),
+                                           numpy_vectors=True, intern=True)
+        visual = robot.link_map['b'].visual
+        self.assertIs(visual.origin.xyz, visual.geometry.size)
+        self.assertFalse(visual.origin.xyz.flags.writeable)
+
+    def test_shared_table(self):
+        import numpy
+        table = {}
+        urdf.Robot.from_xml_string(self.xml, intern=table)
+        robot = urdf.Robot.from_xml_string(self.xml, numpy_vectors=True, intern=table)
+        self.assertIsInstance(robot.link_map['b'].visual.origin.xyz, numpy.ndarray)
+        robot = urdf.Robot.from_xml_string(self.xml, intern=table)
+        self.assertEqual(robot.link_map['b'].visual.origin.xyz, (0., 0., 1.))
+
+    def test_invalid_length(self):
+        with self.assertRaises(AssertionError):
+            urdf.Robot.from_xml_string(self.xml.replace(b'size="1 2 3"', b'size="1 2"'),
+                                       numpy_vectors=True)
+
+
+class TestURDFLazy(unittest.TestCase):
+    xml = TestURDFCompact.xml
+
+    def test_lazy(self):
+        robot = urdf.Robot.from_xml_string(self.xml, lazy=True)
+        link = robot.link_map['b']
+        self.assertEqual(sorted(link._lazy), ['visual'])
+        self.assertNotIn('visual', vars(link))
+        self.assertEqual(link.visual.geometry.size, [1.0, 2.0, 3.0])
+        self.assertEqual(link._lazy, {})
+        self.assertIs(link.visual, link.visual)
+        self.assertEqual(robot.joints[0].limit.effort, 1.0)
+        self.assertEqual(etree.tostring(robot.to_xml()),
+                         etree.tostring(urdf.Robot.from_xml_string(self.xml).to_xml()))
+
+    def test_lazy_stream(self):
+        robot = urdf.Robot.from_xml_stream(io.BytesIO(self.xml), lazy=True)
+        self.assertEqual(robot.link_map['b'].visual.geometry.size, [1.0, 2.0, 3.0])
+
+    def test_lazy_options(self):
+        # Deferred elements are decoded with the options of their parse
+        robot = urdf.Robot.from_xml_string(self.xml, lazy=True, compact=True)
+        visual = robot.link_map['b'].visual
+        self.assertEqual(type(visual).XML_BASE, urdf.Visual)
+        self.assertEqual(visual.geometry.size, (1.0, 2.0, 3.0))
+
+    def test_materialize(self):
+        robot = urdf.Robot.from_xml_string(self.xml, lazy=True)
+        link = robot.link_map['b']
+        visual = urdf.Visual(urdf.Sphere(1.0))
+        link.visual = visual
+        robot.materialize()
+        self.assertIs(link.visual, visual)
+        self.assertEqual(link._lazy, {})
+        self.assertEqual(robot.joints[0]._lazy, {})
+        self.assertEqual(vars(robot.joints[0])['limit'].velocity, 1.0)
+
+
+class TestURDFProfile(unittest.TestCase):
+    xml = TestURDFCompact.xml
+    profile = {
+        'robot': ['name', 'link', 'joint'],
+        'link': ['name'],
+        'joint': ['name', 'type', 'parent', 'child', 'origin'],
+        'joint/origin': [],
+    }
+
+    def test_profile(self):
+        robot = urdf.Robot.from_xml_string(self.xml, profile=self.profile)
+        self.assertEqual(sorted(robot.link_map), ['a', 'b'])
+        self.assertIsNone(robot.link_map['b'].visual)
+        self.assertEqual(robot.gazebos, [])
+        joint = robot.joints[0]
+        self.assertEqual((joint.parent, joint.child, joint.type), ('a', 'b', 'revolute'))
+        self.assertIsNone(joint.limit)
+        self.assertEqual(robot.aggregate_order, robot.links[:1] + [joint] + robot.links[1:])
+
+    def test_profile_path(self):
+        xml = self.xml.replace(b'<child link="b"/>', b'<child link="b"/><origin xyz="1 2 3"/>')
+        robot = urdf.Robot.from_xml_string(xml, profile=self.profile)
+        # Projected objects are not validated
+        origin = robot.joints[0].origin
+        self.assertEqual((origin.xyz, origin.rpy), (None, None))
+
+    @mock.patch('urdf_parser_py.xml_reflection.core.on_error')
+    def test_profile_checks(self, on_error):
+        xml = self.xml.replace(b'<link name="b">', b'<link name="b" bogus="1"><bogus/>')
+        robot = urdf.Robot.from_xml_string(xml, profile=self.profile)
+        self.assertEqual(on_error.call_args_list,
+                         [mock.call('Unknown attribute: bogus'), mock.call('Unknown tag: bogus')])
+        xml = self.xml.replace(b' type="revolute"', b'')
+        with self.assertRaises(Exception):
+            urdf.Robot.from_xml_string(xml, profile={'joint': ['name']})
+
+    def test_profile_stream(self):
+        robot = urdf.Robot.from_xml_stream(io.BytesIO(self.xml), profile=self.profile)
+        self.assertEqual(sorted(robot.link_map), ['a', 'b'])
+        self.assertEqual(robot.gazebos, [])
+        self.assertIsNone(robot.link_map['b'].visual)
+
+
+class TestURDFThreads(unittest.TestCase):
+    xml = '''<robot name="robot{0}">
+  <link name="a"><bogus{0}/></link>
+  <link name="b"/>
+  <joint name="j" type="fixed"><parent link="a"/><child link="b"/><origin xyz="{0} 0 0"/></joint>
+</robot>'''
+
+    def parse_many(self, i, results, start):
+        start.wait()
+        xml = self.xml.format(i)
+        options = [{'compact': True}, {'lazy': True}, {'intern': True}, {}][i % 4]
+        diagnostics = []
+        context = xmlr.ParseContext(diagnostics=diagnostics, on_error=lambda message: None, **options)
+        strict = xmlr.ParseContext(on_error=xmlr.raise_error)
+        try:
+            for j in range(100):
+                robot = urdf.Robot.from_xml_string(xml, context=context)
+                self.assertEqual(robot.name, 'robot{}'.format(i))
+                self.assertEqual(robot.joint_map['j'].origin.xyz[0], i)
+                self.assertEqual(type(robot.links[0]).__name__, 'CompactLink' if i % 4 == 0 else 'Link')
+                self.assertRaises(Exception, urdf.Robot.from_xml_string, xml, context=strict)
+            self.assertEqual(diagnostics, ['Unknown tag: bogus{}'.format(i)] * 100)
+            results[i] = True
+        except Exception as e:
+            results[i] = e
+
+    @mock.patch('urdf_parser_py.xml_reflection.core.on_error', mock.Mock(side_effect=ParseException))
+    def test_concurrent_contexts(self):
+        results = {}
+        start = threading.Event()
+        threads = [threading.Thread(target=self.parse_many, args=(i, results, start)) for i in range(8)]
+        # Switch threads as often as possible
+        if hasattr(sys, 'setswitchinterval'):
+            (get_interval, set_interval, interval) = (sys.getswitchinterval, sys.setswitchinterval, 1e-6)
+        else:
+            (get_interval, set_interval, interval) = (sys.getcheckinterval, sys.setcheckinterval, 1)
+        old_interval = get_interval()
+        set_interval(interval)
+        try:
+            for thread in threads:
+                thread.start()
+            start.set()
+            for thread in threads:
+                thread.join()
+        finally:
+            set_interval(old_interval)
+        self.assertEqual(results, dict((i, True) for i in range(8)))
+        # Contexts did not leak into this thread
+        self.assertIs(xmlr.core.get_context(), xmlr.core.default_context)
+
+    def test_context_and_options(self):
+        context = xmlr.ParseContext()
+        self.assertRaises(Exception, urdf.Robot.from_xml_string, self.xml.format(0), context=context, compact=True)
+
+    def test_skip_default(self):
+        xml = '<safety_controller k_velocity="1"/>'
+        self.assertIsNone(urdf.SafetyController.from_xml_string(xml).k_position)
+        context = xmlr.ParseContext(skip_default=False)
+        self.assertEqual(urdf.SafetyController.from_xml_string(xml, context=context).k_position, 0)
+
+
+class TestRobotTopology(unittest.TestCase):
+    def setUp(self):
+        self.robot = urdf.Robot('tree')
+        # base -> a -> b, base -> c -> d
+        for name in ['base', 'a', 'b', 'c', 'd']:
+            self.robot.add_link(urdf.Link(name))
+        for (parent, child, joint_type) in [('base', 'a', 'revolute'), ('a', 'b', 'fixed'),
+                                            ('base', 'c', 'revolute'), ('c', 'd', 'revolute')]:
+            self.robot.add_joint(urdf.Joint(parent + '_' + child, parent, child, joint_type))
+
+    def test_index(self):
+        topology = self.robot.get_topology()
+        self.assertEqual(self.robot.get_root(), 'base')
+        self.assertTrue(topology.is_ancestor('base', 'd'))
+        self.assertTrue(topology.is_ancestor('c', 'c'))
+        self.assertFalse(topology.is_ancestor('a', 'd'))
+        self.assertEqual(topology.get_depth('d'), 2)
+        self.assertEqual(sorted(topology.get_subtree('c')), ['c', 'd'])
+        self.assertEqual(topology.get_lca('b', 'd'), 'base')
+        self.assertEqual(topology.get_lca('b', 'a'), 'a')
+        self.assertEqual(topology.get_path('b', 'd'), (['b', 'a', 'base'], ['base', 'c', 'd']))
+        self.assertIs(self.robot.get_topology(), topology)
+
+    def test_rebuild(self):
+        topology = self.robot.get_topology()
+        self.robot.add_link(urdf.Link('e'))
+        self.assertRaises(AssertionError, self.robot.get_root)
+        self.robot.add_joint(urdf.Joint('d_e', 'd', 'e', 'fixed'))
+        self.assertIsNot(self.robot.get_topology(), topology)
+        self.assertEqual(self.robot.get_root(), 'base')
+        self.assertEqual(self.robot.get_topology().get_depth('e'), 3)
+
+    def test_chain_through_common_ancestor(self):
+        self.assertEqual(self.robot.get_chain('base', 'd'), ['base', 'base_c', 'c', 'c_d', 'd'])
+        self.assertEqual(self.robot.get_chain('b', 'd'),
+                         ['b', 'a_b', 'a', 'base_a', 'base', 'base_c', 'c', 'c_d', 'd'])
+        self.assertEqual(self.robot.get_chain('b', 'd', links=False, fixed=False),
+                         ['base_a', 'base_c', 'c_d'])
+
+    def test_remove(self):
+        topology = self.robot.get_topology()
+        self.robot.remove_joint('c_d')
+        self.robot.remove_link(self.robot.link_map['d'])
+        self.assertNotIn('d', self.robot.link_map)
+        self.assertNotIn('c_d', self.robot.joint_map)
+        self.assertNotIn('d', self.robot.parent_map)
+        self.assertNotIn('c', self.robot.child_map)
+        self.assertEqual([link.name for link in self.robot.links], ['base', 'a', 'b', 'c'])
+        self.assertEqual(len(self.robot.aggregate_order), 7)
+        self.assertIsNot(self.robot.get_topology(), topology)
+        self.assertEqual(sorted(self.robot.get_topology().get_subtree('base')), ['a', 'b', 'base', 'c'])
+        # Re-added at the end
+        self.robot.add_link(urdf.Link('d'))
+        self.robot.add_joint(urdf.Joint('c_d', 'c', 'd', 'revolute'))
+        self.assertEqual(self.robot.get_chain('b', 'd', links=False),
+                         ['a_b', 'base_a', 'base_c', 'c_d'])
+        self.assertEqual(self.robot.aggregate_order[-1].name, 'c_d')
+        robot = urdf.Robot.from_xml_string(self.robot.to_xml_string())
+        self.assertEqual(robot.parent_map, self.robot.parent_map)
+        self.assertEqual(robot.child_map, self.robot.child_map)
+
+    def test_aggregate_references(self):
+        robot = urdf.Robot('r')
+        links = robot.links
+        robot.add_link(urdf.Link('a'))
+        self.assertEqual([link.name for link in links], ['a'])
+        # Lists assigned by users are appended to in place too
+        joints = []
+        robot.joints = joints
+        robot.add_joint(urdf.Joint('j', 'a', 'a', 'fixed'))
+        self.assertIs(robot.joints, joints)
+        self.assertEqual(len(joints), 1)
+
+    def test_lump_aggregates(self):
+        self.robot.lump_aggregates()
+        self.assertEqual([self.robot.aggregate_type[obj] for obj in self.robot.aggregate_order],
+                         ['link'] * 5 + ['joint'] * 4)
+        self.assertEqual(len(self.robot.links), 5)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,178 @@
+from __future__ import print_function
+
+import os
+import unittest
+import mock
+from lxml import etree
+from urdf_parser_py import urdf
+import urdf_parser_py.xml_reflection as xmlr
+
+ROMEO = os.path.join(os.path.dirname(__file__), 'romeo', 'romeo.urdf')
+
+
+class TestParsePlan(unittest.TestCase):
+    def parse(self, xml, use_parse_plans):
+        errors = []
+        with mock.patch.object(xmlr.core, 'use_parse_plans', use_parse_plans):
+            with mock.patch.object(xmlr.core, 'on_error', errors.append):
+                robot = urdf.Robot.from_xml_string(xml)
+        return (robot, errors)
+
+    def assertSameParse(self, xml):
+        (plan_robot, plan_errors) = self.parse(xml, True)
+        (legacy_robot, legacy_errors) = self.parse(xml, False)
+        self.assertEqual(etree.tostring(plan_robot.to_xml()),
+                         etree.tostring(legacy_robot.to_xml()))
+        self.assertEqual(plan_errors, legacy_errors)
+        return plan_errors
+
+    def test_romeo(self):
+        with open(ROMEO) as f:
+            xml = f.read()
+        self.assertSameParse(xml)
+
+    def test_diagnostics(self):
+        xml = '''<?xml version="1.0"?>
+<robot name="test" extra="1">
+  <link name="a" color="red">
+    <origin xyz="0 0 1"/>
+    <origin xyz="0 0 2"/>
+    <sensor/>
+  </link>
+  <widget/>
+</robot>'''
+        errors = self.assertSameParse(xml)
+        self.assertEqual(errors, [
+            'Scalar element defined multiple times: origin',
+            'Unknown attribute: color',
+            'Unknown tag: sensor',
+            'Unknown attribute: extra',
+            'Unknown tag: widget'])
+
+    def test_missing_required(self):
+        xml = '<robot><joint name="j" type="fixed"><parent link="a"/></joint></robot>'
+        for use_parse_plans in [True, False]:
+            with self.assertRaises(Exception) as cm:
+                self.parse(xml, use_parse_plans)
+            self.assertEqual(str(cm.exception),
+                             'Required element not set in XML: child')
+
+
+
+class TestDuckTypedFactory(unittest.TestCase):
+    new = '''<transmission name="t">
+  <type>SimpleTransmission</type>
+  <joint name="j"><hardwareInterface>EffortJointInterface</hardwareInterface></joint>
+  <actuator name="m"/>
+</transmission>'''
+    old = '''<transmission name="t" type="SimpleTransmission">
+  <joint name="j"/>
+  <actuator name="m"/>
+  <mechanicalReduction>1</mechanicalReduction>
+</transmission>'''
+
+    def parse(self, xml, tried=None):
+        """ (value, classes tried) """
+        if tried is None:
+            tried = []
+        from_xml = xmlr.core.ObjectType.from_xml
+        def record(value_type, node):
+            if node.tag == 'transmission':
+                tried.append(value_type.type)
+            return from_xml(value_type, node)
+        factory = urdf.Robot.XML_REFL.element_map['transmission'].value_type
+        with mock.patch.object(xmlr.core.ObjectType, 'from_xml', record):
+            value = factory.from_xml(etree.fromstring(xml))
+        return (value, tried)
+
+    def test_matches(self):
+        self.assertTrue(urdf.Transmission.xml_matches(etree.fromstring(self.new)))
+        self.assertFalse(urdf.PR2Transmission.xml_matches(etree.fromstring(self.new)))
+        self.assertTrue(urdf.PR2Transmission.xml_matches(etree.fromstring(self.old)))
+        self.assertFalse(urdf.Transmission.xml_matches(etree.fromstring(self.old)))
+
+    def test_dispatch(self):
+        (value, tried) = self.parse(self.old)
+        self.assertEqual(type(value), urdf.PR2Transmission)
+        self.assertEqual(tried, [urdf.PR2Transmission])
+        (value, tried) = self.parse(self.new)
+        self.assertEqual(type(value), urdf.Transmission)
+        self.assertEqual(tried, [urdf.Transmission])
+
+    def test_fallback(self):
+        # Matches Transmission, but fails its check_valid()
+        xml = self.new.replace('<hardwareInterface>EffortJointInterface</hardwareInterface>', '')
+        tried = []
+        with self.assertRaises(Exception) as cm:
+            self.parse(xml, tried)
+        message = str(cm.exception)
+        self.assertTrue(message.startswith('Could not perform duck-typed parsing.'))
+        self.assertEqual(message.count('no hardwareInterface defined'), 1)
+        self.assertIn('Required attribute not set in XML: type', message)
+        # The matched type is not parsed again
+        self.assertEqual(tried, [urdf.Transmission, urdf.PR2Transmission])
+
+
+class TestTypeRegistry(unittest.TestCase):
+    def test_resolved(self):
+        self.assertIs(urdf.Robot.XML_TYPE, xmlr.get_type(urdf.Robot))
+        self.assertIs(xmlr.get_type('vector3'), xmlr.get_type('vector3'))
+        # Not inherited by generated classes
+        self.assertNotIn('XML_TYPE', xmlr.core.compact_class(urdf.Link).__dict__)
+
+    def test_no_lookups(self):
+        with open(ROMEO) as f:
+            xml = f.read()
+        with mock.patch('urdf_parser_py.xml_reflection.core.get_type', side_effect=AssertionError):
+            robot = urdf.Robot.from_xml_string(xml)
+        geometries = [link.visual.geometry for link in robot.links if link.visual is not None]
+        self.assertTrue(geometries)
+        self.assertTrue(all(isinstance(geometry, urdf.Mesh) for geometry in geometries))
+
+    def test_namespace(self):
+        global_type = xmlr.get_type('vector5')
+        xmlr.start_namespace('test_registry')
+        try:
+            self.assertIs(xmlr.get_type('vector5'), global_type)
+            local_type = xmlr.VectorType(5)
+            xmlr.add_type('vector5', local_type)
+            # Earlier lookups do not hide the new type
+            self.assertIs(xmlr.get_type('vector5'), local_type)
+        finally:
+            xmlr.end_namespace()
+        self.assertIs(xmlr.get_type('vector5'), global_type)
+
+
+class TestAggregateList(unittest.TestCase):
+    def test_list(self):
+        values = xmlr.AggregateList(['a', 'b', 'c', 'b'])
+        values.remove('b')
+        self.assertEqual(values, ['a', 'c', 'b'])
+        self.assertEqual(len(values), 3)
+        self.assertIn('b', values)
+        self.assertEqual(values.index('b'), 2)
+        values.remove('b')
+        self.assertNotIn('b', values)
+        self.assertRaises(ValueError, values.remove, 'b')
+        values.append('d')
+        values.insert(0, 'e')
+        self.assertEqual(list(values), ['e', 'a', 'c', 'd'])
+        self.assertEqual(values[1:3], ['a', 'c'])
+        values[0] = 'f'
+        del values[-1]
+        self.assertEqual(values + ['g'], ['f', 'a', 'c', 'g'])
+
+    def test_compaction(self):
+        values = xmlr.AggregateList(range(100))
+        for i in range(0, 100, 3):
+            values.remove(i)
+        self.assertLessEqual(len(values.items), 100)
+        self.assertEqual(list(values), [i for i in range(100) if i % 3])
+        for i in range(100):
+            if i % 3:
+                values.remove(i)
+        self.assertEqual((len(values), len(values.items)), (0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()